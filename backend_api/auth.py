@@ -1,21 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, APIKeyHeader
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, List
-from pydantic import BaseModel # Import BaseModel
+from typing import Optional, Dict, List, Any, Tuple
+from pydantic import BaseModel, Field # Import BaseModel
+import asyncio
+import hashlib
+import hmac
+import secrets
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ttl_cache import TTLCache
+from db import get_client, DATABASE_NAME, API_KEY_COLLECTION_NAME
 
 # --- Configuration ---
 SECRET_KEY = "your-secret-key-for-jwt"  # Replace with a strong, random key in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+VERIFIED_TOKEN_CACHE_SIZE = 10000
+PASSWORD_HASH_WORKERS = 2 # bcrypt releases the GIL, so these run truly in parallel with the event loop
+PASSWORD_HASH_MAX_WAITING = 64 # Logins beyond this many queued are turned away with 503
+API_KEY_HMAC_SECRET = b"your-secret-key-for-api-key-digests"  # Replace with a strong, random key in production
+API_KEY_PREFIX = "lbk"
+API_KEY_CACHE_TTL_SECONDS = 60.0 # Revocations reach other replicas within this window
+API_KEY_SCOPES = ("read", "write") # read: GET/HEAD requests; write: everything else
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
+# get_current_user accepts either a bearer token or an API key, so neither scheme errors on its own
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token", auto_error=False)
+api_key_scheme = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 auth_router = APIRouter(
     prefix="/api/v1/auth",
@@ -30,6 +51,7 @@ class User(BaseModel): # Inherit from BaseModel
     disabled: bool = False
     role: str = "user"
     app_ids: Optional[List[str]] = None
+    scopes: Optional[List[str]] = None # Set when authenticated with an API key; None means unrestricted
 
 class UserInDB(User):
     hashed_password: str
@@ -41,35 +63,129 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# --- Off-loop password hashing ---
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool so logins never block the event loop"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_waiting: int = PASSWORD_HASH_MAX_WAITING):
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            self._slots = asyncio.Semaphore(self.workers)
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) on the pool once a slot is free; 503 if too many callers are already waiting."""
+        self._ensure_started()
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins; retry shortly.",
+                headers={"Retry-After": "1"}
+            )
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.total_wait_seconds += started - queued_at
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_run_seconds += time.perf_counter() - started
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._slots = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds / self.completed * 1000, 2) if self.completed else None,
+            "avg_run_ms": round(self.total_run_seconds / self.completed * 1000, 2) if self.completed else None,
+        }
+
+password_hasher = PasswordHasher()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
 # --- Mock User Database ---
 MOCK_USERS_DB: Dict[str, UserInDB] = {}
 
+# Static mapping for app_ids based on username for mock purposes
+USER_APP_IDS_MAPPING: Dict[str, List[str]] = {
+    "user1": ["APP001", "SHARED01"],
+    "user2": ["APP002"],
+    "admin": ["APP001", "APP002", "APP003", "SHARED01"],
+    "auditor": [] # Auditors might not own apps but can see all
+}
+
+# Mock accounts. Passwords are bcrypt-hashed on first use (see ensure_password_hash) rather
+# than at import, which used to cost a full bcrypt round per user on every process start.
+MOCK_USER_DEFINITIONS: Dict[str, Dict[str, str]] = {
+    "user1": {"password": "user1", "role": "user", "email": "user1@example.com", "full_name": "User One"},
+    "user2": {"password": "user2", "role": "user", "email": "user2@example.com", "full_name": "User Two"},
+    "admin": {"password": "admin", "role": "admin", "email": "admin@example.com", "full_name": "Admin User"},
+    "auditor": {"password": "auditor", "role": "auditor", "email": "auditor@example.com", "full_name": "Auditor User"}
+}
+
 def initialize_mock_users():
-    users_to_create = {
-        "user1": {"password": "user1", "role": "user", "email": "user1@example.com", "full_name": "User One"},
-        "user2": {"password": "user2", "role": "user", "email": "user2@example.com", "full_name": "User Two"},
-        "admin": {"password": "admin", "role": "admin", "email": "admin@example.com", "full_name": "Admin User"},
-        "auditor": {"password": "auditor", "role": "auditor", "email": "auditor@example.com", "full_name": "Auditor User"}
-    }
-    for username, details in users_to_create.items():
-        hashed_password = get_password_hash(details["password"])
+    """Populates MOCK_USERS_DB; cheap, since hashes are computed lazily."""
+    for username, details in MOCK_USER_DEFINITIONS.items():
         MOCK_USERS_DB[username] = UserInDB(
             username=username, 
-            hashed_password=hashed_password, 
+            hashed_password="", # Filled in by ensure_password_hash
             email=details["email"], 
             full_name=details["full_name"], 
             role=details["role"]
         )
-    print("Mock users initialized with dynamically generated password hashes.")
 
 initialize_mock_users()
 
+async def ensure_password_hash(user: UserInDB) -> str:
+    """Returns the user's password hash, hashing a mock user's password on the hashing pool the first time."""
+    if not user.hashed_password:
+        user.hashed_password = await get_password_hash_async(MOCK_USER_DEFINITIONS[user.username]["password"])
+    return user.hashed_password
+
 def get_user(username: str) -> Optional[UserInDB]:
     return MOCK_USERS_DB.get(username)
 
-def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
+async def authenticate_user_async(username: str, password: str) -> Optional[UserInDB]:
+    """Checks a username/password; bcrypt runs on the password hashing pool, never on the event loop."""
     user = get_user(username)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await verify_password_async(password, await ensure_password_hash(user)):
         return None
     if user.disabled:
         return None
@@ -81,46 +197,194 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # jti and iat let individual tokens, or everything issued to a user so far, be revoked
+    to_encode.update({"exp": expire, "iat": round(time.time(), 3), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+def user_token_claims(user: UserInDB) -> Dict[str, Any]:
+    """Identity carried in the signed token, so requests can rebuild User without a store lookup."""
+    return {
+        "sub": user.username,
+        "role": user.role,
+        "app_ids": USER_APP_IDS_MAPPING.get(user.username, []),
+        "email": user.email,
+        "full_name": user.full_name,
+    }
+
+# --- Verified token cache and revocation ---
+# Verified tokens map (by SHA-256 digest) to their resolved User until the token's
+# exp, so the common path is a hash and a dict lookup instead of an HMAC check and
+# a store lookup. Revocation is checked on every request, cached or not.
+# Like MOCK_USERS_DB, both live in process memory.
+verified_token_cache = TTLCache(max_entries=VERIFIED_TOKEN_CACHE_SIZE, ttl_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+REVOKED_TOKEN_IDS: Dict[str, float] = {} # jti -> exp; pruned once the token would have expired anyway
+USER_TOKENS_REVOKED_AT: Dict[str, float] = {} # username -> tokens issued at or before this time are revoked
+
+def is_token_revoked(claims: Dict[str, Any]) -> bool:
+    if claims.get("jti") in REVOKED_TOKEN_IDS:
+        return True
+    revoked_at = USER_TOKENS_REVOKED_AT.get(claims.get("sub"))
+    return revoked_at is not None and claims.get("iat", 0) <= revoked_at
+
+def revoke_token(claims: Dict[str, Any]) -> None:
+    now = time.time()
+    for jti in [jti for jti, exp in REVOKED_TOKEN_IDS.items() if exp < now]:
+        del REVOKED_TOKEN_IDS[jti]
+    if claims.get("jti"):
+        REVOKED_TOKEN_IDS[claims["jti"]] = claims.get("exp", now)
+
+def revoke_user_tokens(username: str) -> None:
+    USER_TOKENS_REVOKED_AT[username] = time.time()
+
+def with_account_state(user: User) -> Optional[User]:
+    """
+    Applies the user store's disabled flag to a User built from claims (None if the account
+    is gone). Claims can't reflect an account disabled after the token was issued, so this
+    runs on every request; like the revocation check it is an in-memory lookup.
+    """
+    user_in_db = get_user(user.username)
+    if user_in_db is None:
+        return None
+    if user_in_db.disabled != user.disabled:
+        return user.model_copy(update={"disabled": user_in_db.disabled})
+    return user
+
+def resolve_token(token: str) -> Tuple[User, Dict[str, Any]]:
+    """Returns the User and claims for a bearer token, verifying it only on a cache miss."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    # Static mapping for app_ids based on username for mock purposes
-    USER_APP_IDS_MAPPING = {
-        "user1": ["APP001", "SHARED01"],
-        "user2": ["APP002"],
-        "admin": ["APP001", "APP002", "APP003", "SHARED01"],
-        "auditor": [] # Auditors might not own apps but can see all
-    }
+    token_digest = hashlib.sha256(token.encode()).digest()
+    cached = verified_token_cache.get(token_digest)
+    if cached is not None:
+        user, claims = cached
+        user = with_account_state(user) if not is_token_revoked(claims) else None
+        if user is None:
+            verified_token_cache.invalidate(token_digest)
+            raise credentials_exception
+        return user, claims
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: Optional[str] = payload.get("sub")
         if username is None:
             raise credentials_exception
-        # Add role to token payload if needed, or fetch from user object
-        user_role: Optional[str] = payload.get("role") 
     except JWTError:
         raise credentials_exception
-    user_in_db = get_user(username)
-    if user_in_db is None:
+    if is_token_revoked(payload):
         raise credentials_exception
-    
-    user_app_ids = USER_APP_IDS_MAPPING.get(username, []) # Get app_ids or default to empty list
-
-    return User(
-        username=user_in_db.username, 
-        email=user_in_db.email, 
-        full_name=user_in_db.full_name, 
-        disabled=user_in_db.disabled, 
-        role=user_in_db.role,
-        app_ids=user_app_ids
-    )
+
+    if "role" in payload and "app_ids" in payload:
+        user = User(
+            username=username,
+            email=payload.get("email"),
+            full_name=payload.get("full_name"),
+            role=payload["role"],
+            app_ids=payload["app_ids"]
+        )
+    else:
+        # Tokens issued before identity claims were added: fall back to the user store
+        user_in_db = get_user(username)
+        if user_in_db is None:
+            raise credentials_exception
+        user = User(
+            username=user_in_db.username,
+            email=user_in_db.email,
+            full_name=user_in_db.full_name,
+            disabled=user_in_db.disabled,
+            role=user_in_db.role,
+            app_ids=USER_APP_IDS_MAPPING.get(username, [])
+        )
+
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        verified_token_cache.set(token_digest, (user, payload), ttl_seconds=remaining)
+    user = with_account_state(user)
+    if user is None:
+        raise credentials_exception
+    return user, payload
+
+# --- API keys ---
+# Keys look like lbk_<key_id>_<secret>. Only an HMAC-SHA256 digest of the secret is stored,
+# so verifying a key is one keyed hash and a constant-time comparison against a record
+# looked up by key_id (cached for API_KEY_CACHE_TTL_SECONDS) -- no bcrypt involved.
+class ApiKeyCreate(BaseModel):
+    name: str
+    scopes: List[str] = list(API_KEY_SCOPES)
+    expires_in_days: Optional[int] = Field(365, ge=1)  # None: never expires
+
+class ApiKeyInfo(BaseModel):
+    key_id: str
+    name: str
+    owner: str
+    role: str
+    app_ids: List[str]
+    scopes: List[str]
+    created_at: datetime
+    expires_at: Optional[datetime] = None
+    revoked: bool = False
+
+class ApiKeyCreated(ApiKeyInfo):
+    api_key: str # Shown once; only its digest is stored
+
+api_key_cache = TTLCache(max_entries=10000, ttl_seconds=API_KEY_CACHE_TTL_SECONDS)
+
+def api_key_digest(secret: str) -> str:
+    return hmac.new(API_KEY_HMAC_SECRET, secret.encode(), hashlib.sha256).hexdigest()
+
+def api_key_collection():
+    return get_client()[DATABASE_NAME][API_KEY_COLLECTION_NAME]
+
+def api_key_info(record: Dict[str, Any]) -> ApiKeyInfo:
+    return ApiKeyInfo(key_id=record["_id"], **{k: v for k, v in record.items() if k in ApiKeyInfo.model_fields and k != "key_id"})
+
+async def load_api_key(key_id: str) -> Optional[Dict[str, Any]]:
+    record = api_key_cache.get(key_id)
+    if record is None:
+        record = await api_key_collection().find_one({"_id": key_id})
+        if record is not None:
+            api_key_cache.set(key_id, record)
+    return record
+
+async def resolve_api_key(api_key: str) -> User:
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+    prefix, _, rest = api_key.partition("_")
+    key_id, _, secret = rest.partition("_")
+    if prefix != API_KEY_PREFIX or not key_id or not secret:
+        raise credentials_exception
+    record = await load_api_key(key_id)
+    if record is None or not hmac.compare_digest(record["digest"], api_key_digest(secret)):
+        raise credentials_exception
+    expires_at = record.get("expires_at")
+    if record.get("revoked") or (expires_at is not None and expires_at.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc)):
+        raise credentials_exception
+    user = with_account_state(User(username=record["owner"], role=record["role"], app_ids=record.get("app_ids", []), scopes=record.get("scopes", [])))
+    if user is None:
+        raise credentials_exception
+    return user
+
+async def get_current_user(
+    request: Request,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    api_key: Optional[str] = Depends(api_key_scheme)
+) -> User:
+    if api_key:
+        user = await resolve_api_key(api_key)
+        required_scope = "read" if request.method in READ_METHODS else "write"
+        if required_scope not in user.scopes:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"API key lacks the '{required_scope}' scope.")
+        return user
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return resolve_token(token)[0]
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if current_user.disabled:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
@@ -129,7 +393,7 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
 # --- Authentication Endpoints ---
 @auth_router.post("/token", summary="Create access token for user")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user_async(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -138,10 +402,68 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role}, expires_delta=access_token_expires
+        data=user_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+@auth_router.post("/logout", status_code=status.HTTP_204_NO_CONTENT, summary="Revoke the access token used for this request")
+async def logout(token: str = Depends(oauth2_scheme)):
+    _, claims = resolve_token(token)
+    revoke_token(claims)
+
+@auth_router.post("/users/{username}/revoke-tokens", status_code=status.HTTP_204_NO_CONTENT, summary="Revoke every token issued to a user so far")
+async def revoke_tokens_for_user(username: str, current_user: User = Depends(get_current_active_user)):
+    if current_user.role != "admin" and current_user.username != username:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can revoke other users' tokens.")
+    revoke_user_tokens(username)
+
+@auth_router.post("/api-keys", response_model=ApiKeyCreated, status_code=status.HTTP_201_CREATED, summary="Create an API key for automation clients")
+async def create_api_key(key_request: ApiKeyCreate, current_user: User = Depends(get_current_active_user)):
+    if current_user.scopes is not None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="API keys cannot create other API keys; log in with a password.")
+    unknown_scopes = set(key_request.scopes) - set(API_KEY_SCOPES)
+    if unknown_scopes or not key_request.scopes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Scopes must be a non-empty subset of {list(API_KEY_SCOPES)}.")
+    key_id = secrets.token_hex(8)
+    secret = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    record = {
+        "_id": key_id,
+        "digest": api_key_digest(secret),
+        "name": key_request.name,
+        # Entitlements are captured from the creating user
+        "owner": current_user.username,
+        "role": current_user.role,
+        "app_ids": current_user.app_ids or [],
+        "scopes": sorted(set(key_request.scopes)),
+        "created_at": now,
+        "expires_at": now + timedelta(days=key_request.expires_in_days) if key_request.expires_in_days is not None else None,
+        "revoked": False,
+    }
+    await api_key_collection().insert_one(record)
+    return ApiKeyCreated(api_key=f"{API_KEY_PREFIX}_{key_id}_{secret}", **api_key_info(record).model_dump())
+
+@auth_router.get("/api-keys", response_model=List[ApiKeyInfo], summary="List your API keys (admins see all)")
+async def list_api_keys(current_user: User = Depends(get_current_active_user)):
+    query = {} if current_user.role == "admin" else {"owner": current_user.username}
+    return [api_key_info(record) async for record in api_key_collection().find(query, {"digest": 0})]
+
+@auth_router.delete("/api-keys/{key_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Revoke an API key")
+async def revoke_api_key(key_id: str, current_user: User = Depends(get_current_active_user)):
+    query: Dict[str, Any] = {"_id": key_id}
+    if current_user.role != "admin":
+        query["owner"] = current_user.username
+    result = await api_key_collection().update_one(query, {"$set": {"revoked": True}})
+    api_key_cache.invalidate(key_id)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="API key not found")
+
+@auth_router.get("/hashing/stats", summary="Password hashing pool utilization and queue depth")
+async def password_hashing_stats(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view password hashing statistics.")
+    return password_hasher.stats()
+
 @auth_router.get("/users/me", response_model=User, summary="Get current authenticated user details")
 async def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user
@@ -1,31 +1,146 @@
+import os
+
 import motor.motor_asyncio
 from bson import ObjectId
-from typing import List, Optional
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import OperationFailure
+from typing import Any, Dict, List, Optional
 
 # Assuming models.py is in the same directory
 from models import VipBase, VipCreate, VipUpdate 
 
-# MongoDB connection URL - Use host.docker.internal for Docker Desktop
-MONGO_DETAILS = "mongodb://host.docker.internal:27017"
+# MongoDB connection URL, shared by every client in the process (Motor here, pymongo in
+# mongodb_config_storage). docker-compose sets MONGODB_URL; the default suits Docker Desktop.
+MONGO_DETAILS = os.getenv("MONGODB_URL", "mongodb://host.docker.internal:27017")
 DATABASE_NAME = "lbaas_db"
 VIP_COLLECTION_NAME = "vips" # Renamed to avoid conflict with function
+CONFIG_COLLECTION_NAME = "lb_configurations" # Shared with mongodb_config_storage.LBaaSConfigStorage
+IDEMPOTENCY_COLLECTION_NAME = "idempotency_keys" # Stored responses for Idempotency-Key replays
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
+PROVISIONING_JOB_COLLECTION_NAME = "provisioning_jobs" # Queue for provisioning.ProvisioningWorkerPool
+PROVISIONING_JOB_TTL_SECONDS = 30 * 24 * 60 * 60
+API_KEY_COLLECTION_NAME = "api_keys" # HMAC digests of automation API keys (see auth.py)
+
+# --- Managed index set ---
+# Every index the API relies on is declared here and ensured at startup
+# (create_indexes is a no-op for indexes that already exist with the same spec).
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    VIP_COLLECTION_NAME: [
+        # list_vips: VIPs a plain user owns, optionally narrowed by environment
+        IndexModel([("owner", ASCENDING), ("environment", ASCENDING)], name="owner_environment"),
+        # The other branches of a plain user's entitlement filter (see entitlements.py), so the whole $or is index-backed
+        IndexModel([("secondary_contact_email", ASCENDING), ("environment", ASCENDING)], name="secondary_contact_email_environment"),
+        IndexModel([("app_id", ASCENDING), ("environment", ASCENDING)], name="app_id_environment"),
+        # list_vips for admins/auditors filtering by environment only
+        IndexModel([("environment", ASCENDING)], name="environment"),
+        # A listener (FQDN + port) can only be defined once
+        IndexModel([("vip_fqdn", ASCENDING), ("port", ASCENDING)], name="vip_fqdn_port_unique", unique=True),
+        # list_vips ?q= search (see vip_search.py): prefix, suffix and trigram substring matches
+        IndexModel([("vip_fqdn_lower", ASCENDING)], name="vip_fqdn_lower"),
+        IndexModel([("fqdn_reversed", ASCENDING)], name="fqdn_reversed"),
+        IndexModel([("fqdn_trigrams", ASCENDING)], name="fqdn_trigrams"),
+        # Reverse lookup from backend server to VIPs (multikey over the pool array)
+        IndexModel([("pool.ip", ASCENDING)], name="pool_ip"),
+        # ?cidr= / ?pool_cidr= subnet range scans over integer IP keys (see ip_keys.py)
+        IndexModel([("vip_ip_key.v", ASCENDING), ("vip_ip_key.hi", ASCENDING), ("vip_ip_key.lo", ASCENDING)], name="vip_ip_key"),
+        IndexModel([("pool_ip_keys.v", ASCENDING), ("pool_ip_keys.hi", ASCENDING), ("pool_ip_keys.lo", ASCENDING)], name="pool_ip_keys"),
+    ],
+    CONFIG_COLLECTION_NAME: [
+        # LBaaSConfigStorage.get_config / store_config / delete_config
+        IndexModel([("vip_id", ASCENDING)], name="vip_id_unique", unique=True),
+        # get_configs_by_environment / _by_datacenter / _by_lb_type
+        IndexModel([("environment", ASCENDING)], name="environment"),
+        IndexModel([("datacenter", ASCENDING)], name="datacenter"),
+        IndexModel([("lb_type", ASCENDING)], name="lb_type"),
+        # Reverse lookup from backend server to configurations (multikey over pools[].members[])
+        IndexModel([("standard_config.pools.members.ip_address", ASCENDING)], name="pool_member_ip_address"),
+        IndexModel([("vip_ip_key.v", ASCENDING), ("vip_ip_key.hi", ASCENDING), ("vip_ip_key.lo", ASCENDING)], name="vip_ip_key"),
+        IndexModel([("member_ip_keys.v", ASCENDING), ("member_ip_keys.hi", ASCENDING), ("member_ip_keys.lo", ASCENDING)], name="member_ip_keys"),
+    ],
+    IDEMPOTENCY_COLLECTION_NAME: [
+        # MongoDB's TTL monitor removes keys (and their stored responses) after a day
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=IDEMPOTENCY_KEY_TTL_SECONDS),
+    ],
+    API_KEY_COLLECTION_NAME: [
+        # Keys are looked up by _id (the key_id); listing is by owner
+        IndexModel([("owner", ASCENDING)], name="owner"),
+    ],
+    PROVISIONING_JOB_COLLECTION_NAME: [
+        # Worker claim: runnable jobs by state, oldest due first (run_after doubles as the lease expiry)
+        IndexModel([("state", ASCENDING), ("run_after", ASCENDING)], name="state_run_after"),
+        # Job history for a VIP
+        IndexModel([("vip_id", ASCENDING), ("created_at", ASCENDING)], name="vip_id_created_at"),
+        # Finished jobs are kept for a month; queued/running jobs have no finished_at and never expire
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=PROVISIONING_JOB_TTL_SECONDS),
+    ],
+}
+
+# Global client, created on first use (not at import) and closed by close_client()
+_client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+
+def get_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    """Returns the shared MongoDB client, creating it on first call."""
+    global _client
+    if _client is None:
+        _client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_DETAILS)
+    return _client
+
+def close_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
 
-# Global client and database (initialized once)
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_DETAILS)
-database = client[DATABASE_NAME]
-vip_collection_global = database[VIP_COLLECTION_NAME] # Used by functions within this module
+def _vip_collection() -> motor.motor_asyncio.AsyncIOMotorCollection:
+    """VIPs collection used by the CRUD functions within this module."""
+    return get_client()[DATABASE_NAME][VIP_COLLECTION_NAME]
 
 # --- Functions to be imported by main.py for dependency injection ---
 async def get_database() -> motor.motor_asyncio.AsyncIOMotorClient:
     """Returns the MongoDB client instance."""
-    # This will use the globally defined client that connects to host.docker.internal
-    return client
+    # This will use the shared client that connects to host.docker.internal
+    return get_client()
 
 def get_vips_collection(db_client: motor.motor_asyncio.AsyncIOMotorClient) -> motor.motor_asyncio.AsyncIOMotorCollection:
     """Returns the VIPs collection from the given database client."""
     db = db_client[DATABASE_NAME]
     return db[VIP_COLLECTION_NAME]
 
+async def ensure_indexes(db_client: motor.motor_asyncio.AsyncIOMotorClient) -> Dict[str, List[str]]:
+    """Creates every index in INDEX_REGISTRY. Returns the index names ensured per collection."""
+    db = db_client[DATABASE_NAME]
+    ensured: Dict[str, List[str]] = {}
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        try:
+            ensured[collection_name] = await db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. existing duplicates block a unique index; keep serving and report it.
+            print(f"Failed to ensure indexes on {collection_name}: {e}")
+            ensured[collection_name] = []
+    return ensured
+
+async def get_index_stats(db_client: motor.motor_asyncio.AsyncIOMotorClient) -> List[Dict[str, Any]]:
+    """Returns $indexStats usage counters for every index on the managed collections."""
+    db = db_client[DATABASE_NAME]
+    stats: List[Dict[str, Any]] = []
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        managed = {index.document["name"] for index in indexes}
+        async for entry in db[collection_name].aggregate([{"$indexStats": {}}]):
+            accesses = entry.get("accesses", {})
+            stats.append({
+                "collection": collection_name,
+                "name": entry["name"],
+                "key": dict(entry.get("key", {})),
+                "ops": accesses.get("ops", 0),
+                "since": accesses.get("since"),
+                "managed": entry["name"] in managed or entry["name"] == "_id_",
+            })
+    return stats
+
+def get_configs_collection(db_client: motor.motor_asyncio.AsyncIOMotorClient) -> motor.motor_asyncio.AsyncIOMotorCollection:
+    """Returns the standardized LB configurations collection from the given database client."""
+    return db_client[DATABASE_NAME][CONFIG_COLLECTION_NAME]
+
 # --- Helper function for DB operations ---
 def vip_helper(vip_doc) -> dict:
     vip_doc["id"] = str(vip_doc["_id"])
@@ -40,14 +155,14 @@ async def create_vip_db(vip_data: VipCreate) -> dict:
     # from datetime import datetime, timezone
     # vip_dict["created_at"] = datetime.now(timezone.utc)
     # vip_dict["updated_at"] = datetime.now(timezone.utc)
-    result = await vip_collection_global.insert_one(vip_dict)
-    new_vip = await vip_collection_global.find_one({"_id": result.inserted_id})
+    result = await _vip_collection().insert_one(vip_dict)
+    new_vip = await _vip_collection().find_one({"_id": result.inserted_id})
     return vip_helper(new_vip)
 
 async def get_all_vips_db() -> List[dict]:
     """Retrieves all VIPs from the database."""
     vips = []
-    async for vip in vip_collection_global.find():
+    async for vip in _vip_collection().find():
         vips.append(vip_helper(vip))
     return vips
 
@@ -57,7 +172,7 @@ async def get_vip_by_id_db(vip_id: str) -> Optional[dict]:
         object_id = ObjectId(vip_id)
     except Exception:
         return None # Invalid ObjectId format
-    vip = await vip_collection_global.find_one({"_id": object_id})
+    vip = await _vip_collection().find_one({"_id": object_id})
     if vip:
         return vip_helper(vip)
     return None
@@ -72,7 +187,7 @@ async def update_vip_db(vip_id: str, vip_update_data: VipUpdate) -> Optional[dic
     update_data = vip_update_data.model_dump(exclude_unset=True)
 
     if not update_data:
-        existing_vip = await vip_collection_global.find_one({"_id": object_id})
+        existing_vip = await _vip_collection().find_one({"_id": object_id})
         if existing_vip:
             return vip_helper(existing_vip)
         return None
@@ -80,15 +195,15 @@ async def update_vip_db(vip_id: str, vip_update_data: VipUpdate) -> Optional[dic
     # from datetime import datetime, timezone
     # update_data["updated_at"] = datetime.now(timezone.utc)
 
-    result = await vip_collection_global.update_one(
+    result = await _vip_collection().update_one(
         {"_id": object_id},
         {"$set": update_data}
     )
     if result.modified_count == 1:
-        updated_vip = await vip_collection_global.find_one({"_id": object_id})
+        updated_vip = await _vip_collection().find_one({"_id": object_id})
         if updated_vip:
             return vip_helper(updated_vip)
-    existing_vip = await vip_collection_global.find_one({"_id": object_id})
+    existing_vip = await _vip_collection().find_one({"_id": object_id})
     if existing_vip:
         return vip_helper(existing_vip)
     return None
@@ -99,6 +214,6 @@ async def delete_vip_db(vip_id: str) -> bool:
         object_id = ObjectId(vip_id)
     except Exception:
         return False # Invalid ObjectId format
-    result = await vip_collection_global.delete_one({"_id": object_id})
+    result = await _vip_collection().delete_one({"_id": object_id})
     return result.deleted_count == 1
 
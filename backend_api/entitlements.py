@@ -0,0 +1,73 @@
+"""
+Entitlement filters for VIP and provisioning-job queries.
+
+What a caller may see or change is compiled into a MongoDB filter from their
+role, username/email and app_ids, and folded into the query itself, so
+authorization costs nothing beyond the (indexed) query and documents the caller
+isn't entitled to never leave the database:
+
+- admin: everything
+- auditor: read everything, write nothing
+- user: VIPs they own, are the secondary contact of, or that belong to one of
+  their app_ids (each $or branch is backed by an index in db.INDEX_REGISTRY)
+
+vip_entitled() applies the same rules to a document already in memory (the VIP
+read-through cache), so a cache hit needs no query at all.
+"""
+
+from typing import Any, Dict, List, Mapping
+
+from auth import User
+
+# Matches no document: _id is always present
+NO_MATCH: Dict[str, Any] = {"_id": {"$exists": False}}
+
+
+def _identities(user: User) -> List[str]:
+    # secondary_contact_email holds an email; mock users' usernames are emails too
+    return list(dict.fromkeys(i for i in (user.username, user.email) if i))
+
+
+def vip_entitlement_filter(user: User, write: bool = False) -> Dict[str, Any]:
+    """MongoDB filter matching exactly the VIPs the user may read (or, with write=True, modify)."""
+    if user.role == "admin":
+        return {}
+    if user.role == "auditor":
+        return NO_MATCH if write else {}
+    clauses: List[Dict[str, Any]] = [
+        {"owner": user.username},
+        {"secondary_contact_email": {"$in": _identities(user)}},
+    ]
+    if user.app_ids:
+        clauses.append({"app_id": {"$in": list(user.app_ids)}})
+    return {"$or": clauses}
+
+
+def vip_entitled(vip: Mapping[str, Any], user: User, write: bool = False) -> bool:
+    """In-memory equivalent of vip_entitlement_filter for a VIP document that is already loaded."""
+    if user.role == "admin":
+        return True
+    if user.role == "auditor":
+        return not write
+    secondary_contacts = vip.get("secondary_contact_email") or []
+    if isinstance(secondary_contacts, str):
+        secondary_contacts = [secondary_contacts]
+    return (
+        vip.get("owner") == user.username
+        or any(contact in secondary_contacts for contact in _identities(user))
+        or vip.get("app_id") in (user.app_ids or [])
+    )
+
+
+def job_entitlement_filter(user: User) -> Dict[str, Any]:
+    """Provisioning jobs: plain users see the jobs they started."""
+    return {"owner": user.username} if user.role == "user" else {}
+
+
+def scope_query(query: Dict[str, Any], *filters: Dict[str, Any]) -> Dict[str, Any]:
+    """ANDs entitlement filters into a query without clobbering any $or the query already has."""
+    scoped = dict(query)
+    for entitlement in filters:
+        if entitlement:
+            scoped["$and"] = scoped.get("$and", []) + [entitlement]
+    return scoped
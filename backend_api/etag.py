@@ -0,0 +1,72 @@
+"""
+ETag helpers for conditional VIP and configuration reads.
+
+A single VIP's ETag is derived from its _id and document version, encoded so
+that an If-Match value can be turned back into an (id, version) pair and used
+directly in a compare-and-swap write filter. Collection and plan ETags are
+opaque digests over the versions of everything they contain.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional, Tuple
+
+from bson import ObjectId
+
+
+def utc_now() -> datetime:
+    """Current UTC time truncated to the millisecond precision MongoDB stores."""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def epoch_millis(dt: Optional[datetime]) -> int:
+    if dt is None:
+        return 0
+    if dt.tzinfo is None:
+        # Motor returns naive datetimes that are already UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def vip_etag(vip_id: Any, version: Optional[int]) -> str:
+    return f'"{vip_id}.{version or 0}"'
+
+
+def parse_vip_etag(etag: str) -> Optional[Tuple[ObjectId, int]]:
+    """Returns (_id, version) encoded in a VIP ETag, or None if it isn't one of ours."""
+    value = etag.strip()
+    if value.startswith("W/"):
+        return None # Weak validators never satisfy If-Match
+    value = value.strip('"')
+    vip_id, _, version = value.partition(".")
+    if not ObjectId.is_valid(vip_id) or not version.isdigit():
+        return None
+    return ObjectId(vip_id), int(version)
+
+
+def digest_etag(parts: Iterable[Any]) -> str:
+    """Strong ETag over an ordered sequence of version components."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def collection_etag(docs: Iterable[dict], *salt: Any) -> str:
+    """Aggregate version of a list of documents: every _id and version, in order."""
+    return digest_etag([*salt, *((doc.get("_id"), doc.get("version") or 0) for doc in docs)])
+
+
+def etag_matches(header_value: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match / If-Match header value matches the given ETag."""
+    if not header_value:
+        return False
+    candidates = [c.strip() for c in header_value.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def if_none_match_status(method: str) -> int:
+    """Status for a request whose If-None-Match matched: 304 for GET/HEAD, 412 for other methods (RFC 9110 13.1.2)."""
+    return 304 if method in ("GET", "HEAD") else 412
@@ -0,0 +1,92 @@
+"""
+Fast response serialization for VIP documents.
+
+Handlers that return VipDB models pay for validation twice: once when building
+VipDB(**doc), and again when FastAPI re-validates the return value against
+response_model before running jsonable_encoder + json.dumps. This module
+validates raw MongoDB documents exactly once through cached TypeAdapters and
+encodes the result with orjson, which handles datetime natively and ObjectId
+through a default hook. Handlers return a FastJSONResponse, which FastAPI
+passes through untouched.
+
+Documents read from MongoDB were validated when they were written, so they go
+through trusted variants of the models whose email fields are plain strings:
+EmailStr re-validation (email_validator + idna) was otherwise most of the cost.
+
+See serialization_benchmark.py for the measured difference.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from models import VipDB, VipSparse
+
+
+class StoredVip(VipDB):
+    """VipDB for documents read back from MongoDB: emails were validated on write."""
+    primary_contact_email: str
+    secondary_contact_email: Optional[str] = None
+    team_distribution_email: Optional[str] = None
+
+
+class StoredVipSparse(VipSparse):
+    """VipSparse for projected documents read back from MongoDB."""
+    primary_contact_email: Optional[str] = None
+    secondary_contact_email: Optional[str] = None
+    team_distribution_email: Optional[str] = None
+
+
+# Building a TypeAdapter compiles a pydantic-core schema, so do it once per type.
+vip_adapter = TypeAdapter(VipDB)
+stored_vip_adapter = TypeAdapter(StoredVip)
+vip_list_adapter = TypeAdapter(List[StoredVip])
+vip_sparse_adapter = TypeAdapter(StoredVipSparse)
+vip_sparse_list_adapter = TypeAdapter(List[StoredVipSparse])
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_orjson_default)
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson; accepts pre-encoded bytes as-is."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def render_vip(vip: Any) -> bytes:
+    """Encodes a raw VIP document (validated here) or an already validated VipDB."""
+    if isinstance(vip, VipDB):
+        return dumps(vip_adapter.dump_python(vip, by_alias=True))
+    return dumps(stored_vip_adapter.dump_python(stored_vip_adapter.validate_python(vip), by_alias=True))
+
+
+def render_vips(vip_docs: Iterable[Dict[str, Any]]) -> bytes:
+    """Validates a list of raw VIP documents once and encodes it."""
+    vips = vip_list_adapter.validate_python(vip_docs)
+    return dumps(vip_list_adapter.dump_python(vips, by_alias=True))
+
+
+def render_sparse_vip(vip_doc: Dict[str, Any]) -> bytes:
+    """Encodes a single projected VIP document; only the projected fields are emitted."""
+    return dumps(vip_sparse_adapter.dump_python(vip_sparse_adapter.validate_python(vip_doc), by_alias=True, exclude_unset=True))
+
+
+def render_sparse_vips(vip_docs: Iterable[Dict[str, Any]]) -> bytes:
+    """Same as render_vips for projected documents; only the projected fields are emitted."""
+    vips = vip_sparse_list_adapter.validate_python(vip_docs)
+    return dumps(vip_sparse_list_adapter.dump_python(vips, by_alias=True, exclude_unset=True))
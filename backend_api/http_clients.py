@@ -0,0 +1,126 @@
+"""
+Application-scoped HTTP clients for outbound integrations.
+
+One httpx.AsyncClient per upstream (TCPwave, ServiceNow, translators) is kept
+for the lifetime of the app, so calls reuse pooled keep-alive connections and
+TLS sessions instead of paying connection setup on every request. Clients are
+opened in the app startup hook and closed on shutdown; a call made outside
+that window (e.g. from a script) opens its client lazily.
+
+Pool limits, HTTP/2 and keep-alive expiry are configured per upstream in
+UPSTREAM_SETTINGS. stats() reports request counters and pool utilization.
+"""
+
+import importlib.util
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 3.0
+
+# HTTP/2 needs the optional h2 package (httpx[http2]); without it we stay on HTTP/1.1.
+# Over plain http:// (the mocks) httpx uses HTTP/1.1 regardless.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+UPSTREAM_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "tcpwave": {"max_connections": 50, "max_keepalive_connections": 20, "keepalive_expiry": 30.0, "http2": True},
+    "servicenow": {"max_connections": 100, "max_keepalive_connections": 40, "keepalive_expiry": 30.0, "http2": True},
+    "translator": {"max_connections": 20, "max_keepalive_connections": 10, "keepalive_expiry": 60.0, "http2": True},
+}
+
+
+class UpstreamClient:
+    """An AsyncClient plus the counters behind its pool metrics"""
+
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        self.name = name
+        self.settings = settings
+        self.http2 = bool(settings.get("http2")) and HTTP2_AVAILABLE
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_keepalive_connections"],
+                keepalive_expiry=settings["keepalive_expiry"],
+            ),
+            timeout=httpx.Timeout(settings.get("timeout", DEFAULT_TIMEOUT_SECONDS), connect=DEFAULT_CONNECT_TIMEOUT_SECONDS),
+            http2=self.http2,
+        )
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await self.client.request(method, url, **kwargs)
+        except httpx.RequestError:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_seconds += time.perf_counter() - started
+
+    def _pool_connections(self) -> Dict[str, int]:
+        # httpx exposes no public pool API; read httpcore's pool if it's there.
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", None) or [])
+        idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+        http2 = sum(1 for c in connections if type(getattr(c, "_connection", None)).__name__ == "AsyncHTTP2Connection")
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle, "http2": http2}
+
+    def stats(self) -> Dict[str, Any]:
+        max_connections = self.settings["max_connections"]
+        connections = self._pool_connections()
+        return {
+            "upstream": self.name,
+            "http2": self.http2,
+            "max_connections": max_connections,
+            "max_keepalive_connections": self.settings["max_keepalive_connections"],
+            "keepalive_expiry": self.settings["keepalive_expiry"],
+            "connections": connections,
+            "utilization": round(connections["active"] / max_connections, 3) if max_connections else None,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_seconds / self.requests * 1000, 2) if self.requests else None,
+        }
+
+
+class HttpClientRegistry:
+    """One pooled client per upstream, created on startup and closed on shutdown"""
+
+    def __init__(self, settings: Dict[str, Dict[str, Any]] = UPSTREAM_SETTINGS):
+        self.settings = settings
+        self._clients: Dict[str, UpstreamClient] = {}
+
+    def start(self) -> None:
+        for name in self.settings:
+            self.get(name)
+
+    def get(self, upstream: str) -> UpstreamClient:
+        upstream_client = self._clients.get(upstream)
+        if upstream_client is None or upstream_client.client.is_closed:
+            if upstream not in self.settings:
+                raise ValueError(f"Unknown upstream: {upstream}")
+            upstream_client = UpstreamClient(upstream, self.settings[upstream])
+            self._clients[upstream] = upstream_client
+        return upstream_client
+
+    async def close(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for upstream_client in clients:
+            await upstream_client.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"http2_available": HTTP2_AVAILABLE, "upstreams": [c.stats() for c in self._clients.values()]}
+
+
+http_clients = HttpClientRegistry()
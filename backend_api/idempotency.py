@@ -0,0 +1,196 @@
+"""
+Idempotency-Key support for non-idempotent POST endpoints.
+
+The first request with a given key claims it by inserting a record into the
+idempotency_keys collection (the unique _id makes the claim atomic across
+replicas), executes, and stores its response. Retries with the same key and
+payload get the stored response back without executing anything. A retry that
+arrives while the original is still running waits for it: in-process through a
+shared future, across replicas by polling the record. Records expire through a
+TTL index (see db.INDEX_REGISTRY).
+
+A claim is a lease (locked_until), renewed while the request executes. If the
+process holding it dies, the lease runs out and a waiting retry takes the
+record over and executes the request itself, instead of the key staying
+in_progress until the TTL removes it.
+"""
+
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import motor.motor_asyncio
+import orjson
+from bson import Binary
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pymongo.errors import DuplicateKeyError
+
+from db import DATABASE_NAME, IDEMPOTENCY_COLLECTION_NAME
+
+MAX_KEY_LENGTH = 255
+IN_PROGRESS_WAIT_SECONDS = 30.0
+IN_PROGRESS_POLL_SECONDS = 0.2
+CLAIM_LEASE_SECONDS = 15.0 # Shorter than IN_PROGRESS_WAIT_SECONDS, so a waiter outlives a dead holder's lease
+CLAIM_RENEW_SECONDS = 5.0
+REPLAY_HEADER = "Idempotent-Replayed"
+
+# Requests currently executing in this process, by record _id
+_in_flight: Dict[str, "asyncio.Future[None]"] = {}
+
+
+def _request_hash(payload: Any) -> str:
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _replay(record: Dict[str, Any]) -> Response:
+    headers = dict(record.get("headers") or {})
+    headers[REPLAY_HEADER] = "true"
+    return Response(
+        content=bytes(record["body"]),
+        status_code=record["status_code"],
+        media_type=record.get("media_type"),
+        headers=headers
+    )
+
+
+def _lease_until() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=CLAIM_LEASE_SECONDS)
+
+
+def _lease_expired(record: Dict[str, Any]) -> bool:
+    locked_until = record.get("locked_until")
+    if locked_until is None:
+        return True # Claimed before leases existed
+    if locked_until.tzinfo is None:
+        locked_until = locked_until.replace(tzinfo=timezone.utc) # Motor returns naive UTC datetimes
+    return locked_until < datetime.now(timezone.utc)
+
+
+async def _take_over(collection: motor.motor_asyncio.AsyncIOMotorCollection, record_id: str, lease_owner: str) -> bool:
+    """Claims an in_progress record whose lease has run out; only one contender can win."""
+    taken = await collection.find_one_and_update(
+        {"_id": record_id, "state": "in_progress", "locked_until": {"$not": {"$gte": datetime.now(timezone.utc)}}},
+        {"$set": {"lease_owner": lease_owner, "locked_until": _lease_until()}},
+        projection={"_id": 1}
+    )
+    return taken is not None
+
+
+async def _renew_lease(collection: motor.motor_asyncio.AsyncIOMotorCollection, record_id: str, lease_owner: str) -> None:
+    while True:
+        await asyncio.sleep(CLAIM_RENEW_SECONDS)
+        try:
+            await collection.update_one(
+                {"_id": record_id, "lease_owner": lease_owner, "state": "in_progress"},
+                {"$set": {"locked_until": _lease_until()}}
+            )
+        except Exception as e:
+            print(f"Failed to renew idempotency lease for {record_id}: {e}")
+
+
+async def _wait_for_completion(collection: motor.motor_asyncio.AsyncIOMotorCollection, record_id: str, lease_owner: str) -> Optional[Dict[str, Any]]:
+    """
+    Waits for another request holding the key to finish and returns its completed record,
+    or None if the holder's lease expired and this request took the key over.
+    """
+    future = _in_flight.get(record_id)
+    if future is not None:
+        await asyncio.shield(future)
+    deadline = asyncio.get_running_loop().time() + IN_PROGRESS_WAIT_SECONDS
+    while True:
+        record = await collection.find_one({"_id": record_id})
+        if record is None:
+            # The original failed and released the key; let the client retry.
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The original request with this Idempotency-Key failed; retry the request.")
+        if record.get("state") == "completed":
+            return record
+        if _lease_expired(record) and await _take_over(collection, record_id, lease_owner):
+            return None
+        if asyncio.get_running_loop().time() > deadline:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A request with this Idempotency-Key is still in progress.")
+        await asyncio.sleep(IN_PROGRESS_POLL_SECONDS)
+
+
+async def run_idempotent(
+    db_client: motor.motor_asyncio.AsyncIOMotorClient,
+    idempotency_key: str,
+    scope: str,
+    payload: Any,
+    operation: Callable[[], Awaitable[Response]]
+) -> Response:
+    """
+    Execute operation at most once per (scope, key) and replay its response afterwards.
+
+    Args:
+        db_client: MongoDB client
+        idempotency_key: Client-supplied Idempotency-Key header value
+        scope: Endpoint and caller the key belongs to, e.g. "create_vip:user1"
+        payload: JSON-able request payload; a reused key with a different payload is rejected
+        operation: Coroutine factory performing the request and returning its Response
+    """
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters.")
+
+    collection = db_client[DATABASE_NAME][IDEMPOTENCY_COLLECTION_NAME]
+    record_id = f"{scope}:{idempotency_key}"
+    request_hash = _request_hash(payload)
+    lease_owner = uuid.uuid4().hex
+
+    try:
+        await collection.insert_one({
+            "_id": record_id,
+            "state": "in_progress",
+            "request_hash": request_hash,
+            "lease_owner": lease_owner,
+            "locked_until": _lease_until(),
+            "created_at": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        record = await collection.find_one({"_id": record_id})
+        if record is not None and record.get("request_hash") != request_hash:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Idempotency-Key was already used with a different request payload.")
+        if record is None or record.get("state") != "completed":
+            record = await _wait_for_completion(collection, record_id, lease_owner)
+        if record is not None:
+            return _replay(record)
+        # The previous holder's lease expired: this request now holds the key and executes.
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[record_id] = future
+    renewal = asyncio.create_task(_renew_lease(collection, record_id, lease_owner))
+
+    def release():
+        renewal.cancel()
+        if _in_flight.get(record_id) is future:
+            del _in_flight[record_id]
+        future.set_result(None)
+
+    try:
+        response = await operation()
+    except BaseException:
+        # Release the key so a retry can execute; errors are not replayed.
+        try:
+            await collection.delete_one({"_id": record_id, "lease_owner": lease_owner})
+        finally:
+            release()
+        raise
+
+    try:
+        # Conditional on the lease: a holder that lost its key to a takeover doesn't overwrite the new holder.
+        await collection.update_one(
+            {"_id": record_id, "lease_owner": lease_owner},
+            {"$set": {
+                "state": "completed",
+                "status_code": response.status_code,
+                "media_type": response.media_type,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "content-type")},
+                "body": Binary(response.body),
+                "completed_at": datetime.now(timezone.utc)
+            }}
+        )
+    finally:
+        release()
+    return response
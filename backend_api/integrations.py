@@ -5,6 +5,8 @@ import asyncio
 from typing import Dict, Any, Optional
 
 from models import VipBase # For type hinting if needed
+from http_clients import http_clients
+from resilience import resilience, CircuitOpenError, DeadlineExceededError
 
 # --- Configuration for Mock Services (URLs will be defined when mocks are built) ---
 # These URLs assume the mock services will be running and accessible.
@@ -15,35 +17,42 @@ SERVICENOW_MOCK_URL = "http://lbaas-mock-servicenow:8002" # Updated: Base URL fo
 TRANSLATOR_BASE_URL = "http://localhost:8003/translate" # Example base URL for translator services (still a placeholder)
 
 # --- HTTP Client (reusable) ---
-async def _make_http_request(method: str, url: str, json_payload: Optional[Dict] = None, params: Optional[Dict] = None) -> Dict[str, Any]:
+# Requests go through the shared per-upstream clients in http_clients.py (pooled keep-alive connections)
+# and the upstream's circuit breaker / retry / hedging / deadline policy in resilience.py.
+IDEMPOTENT_METHODS = ("GET", "PUT", "DELETE")
+
+async def _make_http_request(method: str, url: str, json_payload: Optional[Dict] = None, params: Optional[Dict] = None,
+                             upstream: str = "servicenow", hedge: bool = False, deadline: Optional[float] = None) -> Dict[str, Any]:
     """Helper function to make asynchronous HTTP requests."""
-    async with httpx.AsyncClient() as client:
+    method = method.upper()
+    if method not in ("GET", "POST", "PUT", "DELETE"):
+        raise ValueError(f"Unsupported HTTP method: {method}")
+    client = http_clients.get(upstream)
+    try:
+        print(f"Making {method} request to {url} with params={params} json={json_payload}")
+        response = await resilience.get(upstream).call(
+            lambda: client.request(method, url, json=json_payload, params=params),
+            idempotent=method in IDEMPOTENT_METHODS, hedge=hedge, deadline=deadline
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        print(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+        error_detail = e.response.text
         try:
-            print(f"Making {method} request to {url} with params={params} json={json_payload}")
-            if method.upper() == "GET":
-                response = await client.get(url, params=params, timeout=10.0)
-            elif method.upper() == "POST":
-                response = await client.post(url, json=json_payload, params=params, timeout=10.0)
-            elif method.upper() == "PUT":
-                response = await client.put(url, json=json_payload, params=params, timeout=10.0)
-            elif method.upper() == "DELETE":
-                response = await client.delete(url, params=params, timeout=10.0)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
-            
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
-            error_detail = e.response.text
-            try:
-                error_detail = e.response.json() # Try to parse JSON error from service
-            except Exception:
-                pass # Keep as text if not JSON
-            return {"error": True, "status_code": e.response.status_code, "detail": error_detail}
-        except httpx.RequestError as e:
-            print(f"Request error occurred: {e}")
-            return {"error": True, "status_code": 503, "detail": f"Service unavailable or network error: {str(e)}"}
+            error_detail = e.response.json() # Try to parse JSON error from service
+        except Exception:
+            pass # Keep as text if not JSON
+        return {"error": True, "status_code": e.response.status_code, "detail": error_detail}
+    except CircuitOpenError as e:
+        print(f"Request short-circuited: {e}")
+        return {"error": True, "status_code": 503, "detail": str(e)}
+    except DeadlineExceededError as e:
+        print(f"Request deadline exceeded: {e}")
+        return {"error": True, "status_code": 504, "detail": str(e)}
+    except httpx.RequestError as e:
+        print(f"Request error occurred: {e}")
+        return {"error": True, "status_code": 503, "detail": f"Service unavailable or network error: {str(e)}"}
 
 # --- TCPwave IPAM Mock Integration ---
 async def call_tcpwave_ipam_mock(action: str, payload: Optional[Dict] = None, fqdn: Optional[str] = None, ip_address: Optional[str] = None, subnet_id: Optional[str] = None) -> Dict[str, Any]:
@@ -51,23 +60,31 @@ async def call_tcpwave_ipam_mock(action: str, payload: Optional[Dict] = None, fq
     if action == "request_ip":
         if not payload: # Expects {"subnet_id": "..."}
             return {"error": True, "detail": "Payload with subnet_id required for request_ip"}
-        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/request_ip", json_payload=payload)
+        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/request_ip", json_payload=payload, upstream="tcpwave")
     elif action == "reserve_ip":
         if not payload: # Expects {"ip_address": "...", "fqdn": "...", "subnet_id": "..."}
             return {"error": True, "detail": "Payload required for reserve_ip"}
-        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/reserve_ip", json_payload=payload)
+        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/reserve_ip", json_payload=payload, upstream="tcpwave")
+    elif action == "request_ips":
+        if not payload: # Expects {"allocations": [{"subnet_id": "...", "fqdn": "..."}, ...]}
+            return {"error": True, "detail": "Payload with allocations required for request_ips"}
+        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/request_ips", json_payload=payload, upstream="tcpwave")
+    elif action == "reserve_ips":
+        if not payload: # Expects {"reservations": [{"ip_address": "...", "fqdn": "...", "subnet_id": "..."}, ...]}
+            return {"error": True, "detail": "Payload with reservations required for reserve_ips"}
+        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/reserve_ips", json_payload=payload, upstream="tcpwave")
     elif action == "release_ip":
         if not payload: # Expects {"ip_address": "..."}
             return {"error": True, "detail": "Payload with ip_address required for release_ip"}
-        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/release_ip", json_payload=payload)
+        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/release_ip", json_payload=payload, upstream="tcpwave")
     elif action == "update_fqdn":
         if not payload: # Expects {"ip_address": "...", "fqdn": "..."}
             return {"error": True, "detail": "Payload required for update_fqdn"}
-        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/update_fqdn", json_payload=payload)
+        return await _make_http_request("POST", f"{TCPWAVE_MOCK_URL}/api/ipam/update_fqdn", json_payload=payload, upstream="tcpwave")
     elif action == "resolve_fqdn":
         if not fqdn:
             return {"error": True, "detail": "FQDN parameter required for resolve_fqdn"}
-        return await _make_http_request("GET", f"{TCPWAVE_MOCK_URL}/api/ipam/resolve", params={"fqdn": fqdn})
+        return await _make_http_request("GET", f"{TCPWAVE_MOCK_URL}/api/ipam/resolve", params={"fqdn": fqdn}, upstream="tcpwave", hedge=True)
     
     print(f"Unknown TCPwave action: {action}")
     return {"error": True, "detail": f"Unknown TCPwave IPAM action: {action}"}
@@ -97,7 +114,7 @@ async def call_servicenow_incident_validation_mock(incident_id: str) -> Dict[str
     """Calls ServiceNow for incident ticket validation."""
     if not incident_id:
         return {"error": True, "detail": "Incident ID required for validation"}
-    return await _make_http_request("GET", f"{SERVICENOW_MOCK_URL}/api/servicenow_mock/validate_incident", params={"number": incident_id})
+    return await _make_http_request("GET", f"{SERVICENOW_MOCK_URL}/api/servicenow_mock/validate_incident", params={"number": incident_id}, hedge=True)
 
 # --- Ansible/Translator Module Integration (Still a Placeholder) ---
 async def call_translator_module(vendor: str, vip_data: VipBase, operation: str) -> Dict[str, Any]:
@@ -105,9 +122,11 @@ async def call_translator_module(vendor: str, vip_data: VipBase, operation: str)
     print(f"Calling Translator Module: Vendor={vendor}, VIP FQDN={vip_data.vip_fqdn}, Operation={operation}")
     # This will eventually make an HTTP call to the translator service, e.g.:
     # translator_url = f"{TRANSLATOR_BASE_URL}/{vendor}/{operation}"
-    # return await _make_http_request("POST", translator_url, json_payload=vip_data.model_dump())
+    # return await _make_http_request("POST", translator_url, json_payload=vip_data.model_dump(), upstream="translator")
     await asyncio.sleep(0.1) # Simulate network latency for now
-    if operation == "deploy" or operation == "update":
+    if operation == "translate":
+        return {"status": "success", "message": f"VIP {vip_data.vip_fqdn} translated for {vendor}", "config_generated": "mock config data..."}
+    elif operation == "deploy" or operation == "update":
         return {"status": "success", "message": f"VIP {vip_data.vip_fqdn} {operation} operation placeholder for {vendor}", "config_generated": "mock config data..."}
     elif operation == "delete":
         return {"status": "success", "message": f"VIP {vip_data.vip_fqdn} {operation} operation placeholder for {vendor}"}
@@ -0,0 +1,130 @@
+"""
+Integer-encoded IP address keys for indexed subnet queries.
+
+IP addresses are stored as strings, which MongoDB can only compare lexically.
+Alongside them we store a sortable key per address:
+
+    {"v": 4 | 6, "hi": <int64>, "lo": <int64>}
+
+hi/lo are the upper and lower 64 bits of the 128-bit address (IPv4 addresses
+use hi = 0 before the offset), each shifted by -2**63 so the unsigned value
+fits MongoDB's signed int64 while keeping its order. A CIDR block then maps to
+one contiguous range over the compound index (v, hi, lo).
+"""
+
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+
+INT64_OFFSET = 1 << 63
+LOW_64_MASK = (1 << 64) - 1
+BACKFILL_BATCH_SIZE = 1000
+
+
+def ip_key(ip: Optional[str]) -> Optional[Dict[str, int]]:
+    """Sortable key for an IP address string, or None if it isn't a valid address."""
+    if not ip:
+        return None
+    try:
+        address = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return None
+    value = int(address)
+    return {
+        "v": address.version,
+        "hi": (value >> 64) - INT64_OFFSET,
+        "lo": (value & LOW_64_MASK) - INT64_OFFSET,
+    }
+
+
+def ip_keys(ips: Iterable[Optional[str]]) -> List[Dict[str, int]]:
+    return [key for key in (ip_key(ip) for ip in ips) if key is not None]
+
+
+def vip_ip_fields(vip_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Derived key fields for whichever of vip_ip / pool are present in a VIP document or update."""
+    fields: Dict[str, Any] = {}
+    if "vip_ip" in vip_data:
+        fields["vip_ip_key"] = ip_key(vip_data["vip_ip"])
+    if "pool" in vip_data:
+        fields["pool_ip_keys"] = ip_keys(member.get("ip") for member in vip_data["pool"] or [])
+    return fields
+
+
+def config_ip_fields(standard_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Derived key fields for a standardized LB configuration."""
+    virtual_server = standard_config.get("virtual_server") or {}
+    return {
+        "vip_ip_key": ip_key(virtual_server.get("ip_address")),
+        "member_ip_keys": ip_keys(
+            member.get("ip_address")
+            for pool in standard_config.get("pools") or []
+            for member in pool.get("members") or []
+        ),
+    }
+
+
+def cidr_range(cidr: str) -> Dict[str, Any]:
+    """Range conditions on (v, hi, lo) covering every address in a CIDR block."""
+    try:
+        network = ipaddress.ip_network(cidr.strip(), strict=False)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CIDR: {cidr}")
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    first_hi, last_hi = (first >> 64) - INT64_OFFSET, (last >> 64) - INT64_OFFSET
+    first_lo, last_lo = (first & LOW_64_MASK) - INT64_OFFSET, (last & LOW_64_MASK) - INT64_OFFSET
+    if first_hi == last_hi:
+        # Prefix of 64 bits or more (always true for IPv4): fixed hi, ranged lo
+        return {"v": network.version, "hi": first_hi, "lo": {"$gte": first_lo, "$lte": last_lo}}
+    # Shorter IPv6 prefixes start and end on 64-bit boundaries, so lo is unconstrained
+    return {"v": network.version, "hi": {"$gte": first_hi, "$lte": last_hi}}
+
+
+def cidr_filter(field: str, cidr: str, array: bool = False) -> Dict[str, Any]:
+    """
+    MongoDB filter matching documents whose key field lies in the CIDR block.
+
+    Args:
+        field: Key field, e.g. "vip_ip_key" or "pool_ip_keys"
+        cidr: CIDR block, e.g. "10.10.0.0/16"
+        array: True if the field is an array of keys (conditions must hold for one element)
+    """
+    conditions = cidr_range(cidr)
+    if array:
+        return {field: {"$elemMatch": conditions}}
+    return {f"{field}.{name}": condition for name, condition in conditions.items()}
+
+
+async def backfill_vip_ip_keys(vips_collection) -> int:
+    """Adds IP key fields to VIPs written before they existed (e.g. by seed_mongo.py)."""
+    requests = []
+    updated = 0
+    async for vip in vips_collection.find({"pool_ip_keys": {"$exists": False}}, {"vip_ip": 1, "pool": 1}):
+        requests.append(UpdateOne({"_id": vip["_id"]}, {"$set": vip_ip_fields({"vip_ip": vip.get("vip_ip"), "pool": vip.get("pool")})}))
+        if len(requests) >= BACKFILL_BATCH_SIZE:
+            await vips_collection.bulk_write(requests, ordered=False)
+            updated += len(requests)
+            requests = []
+    if requests:
+        await vips_collection.bulk_write(requests, ordered=False)
+        updated += len(requests)
+    return updated
+
+
+async def backfill_config_ip_keys(configs_collection) -> int:
+    """Adds IP key fields to LB configurations stored before they existed."""
+    requests = []
+    updated = 0
+    async for config in configs_collection.find({"member_ip_keys": {"$exists": False}}, {"standard_config": 1}):
+        requests.append(UpdateOne({"_id": config["_id"]}, {"$set": config_ip_fields(config.get("standard_config") or {})}))
+        if len(requests) >= BACKFILL_BATCH_SIZE:
+            await configs_collection.bulk_write(requests, ordered=False)
+            updated += len(requests)
+            requests = []
+    if requests:
+        await configs_collection.bulk_write(requests, ordered=False)
+        updated += len(requests)
+    return updated
@@ -1,23 +1,48 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Body
+from startup_profile import startup_profile # First, so import timings cover everything below
+from fastapi import FastAPI, HTTPException, Depends, status, Body, Query, Response, Header
 from fastapi.middleware.cors import CORSMiddleware # Added for CORS
-from typing import List, Dict, Optional, Any
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Optional, Any, AsyncIterator
 # from uuid import uuid4 # Not used for MongoDB _id
 import motor.motor_asyncio
-from pymongo import ReturnDocument # Added this import
+from pymongo import ReturnDocument, InsertOne, UpdateOne, DeleteOne # Added this import
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import asyncio
 from datetime import datetime, timezone
+from bson import ObjectId
+startup_profile.mark_imports("framework")
 
-from models import VipBase, VipCreate, VipDB, VipUpdate, PoolMember, Monitor, Persistence, PyObjectId, VipDeletePayload
-from auth import get_current_active_user, User, auth_router
+from models import (
+    VipBase, VipCreate, VipDB, VipUpdate, VipSparse, PoolMember, Monitor, Persistence, PyObjectId, VipDeletePayload,
+    VipBatchRequest, VipBatchResponse, VipBatchItemResult, VipStats,
+    PoolMemberImpact, PoolMemberVipMatch, PoolMemberConfigMatch, PoolMemberLookupRequest, ProvisioningJob
+)
+from auth import get_current_active_user, User, auth_router, verified_token_cache, api_key_cache, password_hasher
+startup_profile.mark_imports("models_auth")
 from integrations import (
     call_tcpwave_ipam_mock,
     call_servicenow_cmdb_mock,
     call_servicenow_incident_validation_mock,
     call_translator_module
 )
-from db import get_database, get_vips_collection
-from mongodb_config_storage import LBaaSConfigStorage, EnvironmentPromotion, LBMigration
+from db import get_database, get_vips_collection, get_configs_collection, ensure_indexes, get_index_stats, close_client
+import ipaddress
+from mongodb_config_storage import LBaaSConfigStorage, EnvironmentPromotion, LBMigration, close_config_storage
+from vip_cache import vip_cache
+from ttl_cache import TTLCache
+from vip_search import search_fields, build_search_filter, search_pipeline, rank_cursor, backfill_search_fields
+from ip_keys import vip_ip_fields, cidr_filter, backfill_vip_ip_keys, backfill_config_ip_keys
+from etag import utc_now, vip_etag, parse_vip_etag, collection_etag, etag_matches
+from idempotency import run_idempotent
+from fast_json import FastJSONResponse, render_vip, render_vips, render_sparse_vip, render_sparse_vips
+from provisioning import provisioning_workers, new_job_document, get_jobs_collection
+from http_clients import http_clients
+from resilience import resilience
+from preflight import run_preflight, preflight_stats
+from entitlements import vip_entitlement_filter, vip_entitled, job_entitlement_filter, scope_query
 from promotion_api import router as promotion_router
 from migration_api import router as migration_router
+startup_profile.mark_imports("app_modules")
 
 # --- App Initialization ---
 app = FastAPI(
@@ -44,107 +69,590 @@ app.add_middleware(
 
 app.include_router(auth_router)
 
+# Paging defaults for VIP listing
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+STREAM_BATCH_SIZE = 500
+
+# Inventory statistics are recomputed at most this often per distinct scope
+VIP_STATS_TTL_SECONDS = 30.0
+VIP_STATS_TOP_OWNERS = 10
+vip_stats_cache = TTLCache(max_entries=256, ttl_seconds=VIP_STATS_TTL_SECONDS)
+
+# Incident validations: one change window touches many VIPs under the same incident.
+# Approvals are cached longer than rejections so a newly approved incident is picked up quickly.
+INCIDENT_VALID_TTL_SECONDS = 300.0
+INCIDENT_INVALID_TTL_SECONDS = 15.0
+incident_validation_cache = TTLCache(max_entries=4096, ttl_seconds=INCIDENT_VALID_TTL_SECONDS)
+
+# Fields that may be requested through ?fields= (sparse fieldsets)
+VIP_PROJECTABLE_FIELDS = set(VipDB.model_fields) - {"id"}
+
 # --- Helper Functions for Entitlements ---
-async def check_ownership_or_admin(vip_id: str, current_user: User, db_client: motor.motor_asyncio.AsyncIOMotorClient) -> VipDB:
+# Entitlements are pushed down into every VIP query (see entitlements.py); when a scoped query
+# matches nothing, an _id-only lookup tells "not found" (404) from "not yours" (403).
+async def check_ownership_or_admin(vip_id: str, current_user: User, db_client: motor.motor_asyncio.AsyncIOMotorClient,
+                                   write: bool = False) -> VipDB:
     vips_collection = get_vips_collection(db_client)
     try:
         obj_id = PyObjectId(vip_id)
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid VIP ID format: {vip_id}")
-        
-    vip = await vips_collection.find_one({"_id": obj_id })
+
+    vip_db = await load_vip(vips_collection, obj_id, current_user, write)
+    if not vip_db:
+        await raise_vip_not_visible(vips_collection, obj_id)
+    return vip_db
+
+async def load_vip(vips_collection: motor.motor_asyncio.AsyncIOMotorCollection, obj_id: ObjectId,
+                   current_user: User, write: bool = False) -> Optional[VipDB]:
+    """Returns the VIP if the user is entitled to it, from the read-through cache or from an entitlement-scoped query."""
+    vip_db = vip_cache.get(obj_id)
+    if vip_db is not None:
+        entitled = vip_entitled(
+            {"owner": vip_db.owner, "secondary_contact_email": vip_db.secondary_contact_email, "app_id": vip_db.app_id},
+            current_user, write
+        )
+        return vip_db if entitled else None
+    read_token = vip_cache.read_token()
+    vip = await vips_collection.find_one(scope_query({"_id": obj_id}, vip_entitlement_filter(current_user, write)))
     if not vip:
+        return None
+    return vip_cache.put(vip, read_token)
+
+async def raise_vip_not_visible(vips_collection: motor.motor_asyncio.AsyncIOMotorCollection, obj_id: ObjectId):
+    """Called after an entitlement-scoped lookup came back empty: 404 if the VIP doesn't exist, else 403."""
+    if not await vips_collection.find_one({"_id": obj_id}, {"_id": 1}):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="VIP not found")
-    
-    vip_db = VipDB(**vip)
-    if current_user.role == "admin":
-        return vip_db
-    secondary_contacts = vip_db.secondary_contact_email or [] 
-    if vip_db.owner == current_user.username or current_user.username in secondary_contacts:
-        return vip_db
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this VIP")
 
+async def raise_vip_write_failure(vips_collection: motor.motor_asyncio.AsyncIOMotorCollection, obj_id: ObjectId, current_user: User,
+                                  conflict_status: int = status.HTTP_412_PRECONDITION_FAILED):
+    """Explains why a filtered write matched nothing: VIP gone (404), not ours (403) or a version conflict (412/409)."""
+    vip = await vips_collection.find_one(scope_query({"_id": obj_id}, vip_entitlement_filter(current_user, write=True)), {"version": 1})
+    if not vip:
+        await raise_vip_not_visible(vips_collection, obj_id)
+    raise HTTPException(
+        status_code=conflict_status,
+        detail=f"VIP was modified concurrently; current version is {vip.get('version') or 0}",
+        headers={"ETag": vip_etag(vip["_id"], vip.get("version"))}
+    )
+
+def version_filter(obj_id: ObjectId, if_match: Optional[str], expected_version: Optional[int] = None) -> Dict[str, Any]:
+    """Compare-and-swap condition from an If-Match ETag and/or an explicit expected version."""
+    versions = set()
+    if expected_version is not None:
+        versions.add(expected_version)
+    if if_match and if_match.strip() != "*":
+        parsed = parse_vip_etag(if_match)
+        if parsed is None or parsed[0] != obj_id:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="If-Match does not refer to this VIP")
+        versions.add(parsed[1])
+    if not versions:
+        return {}
+    if len(versions) > 1:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="If-Match and expected_version disagree")
+    version = versions.pop()
+    # Documents written before versioning have no version field and count as version 0.
+    return {"version": version if version else None}
+
+def incident_validation_ttl(validation_result: Dict[str, Any]) -> Optional[float]:
+    """Approvals get the long TTL, definitive rejections the short one; upstream failures aren't cached."""
+    if validation_result.get("error"):
+        code = validation_result.get("status_code")
+        return INCIDENT_INVALID_TTL_SECONDS if code is not None and 400 <= code < 500 and code != 429 else None
+    return INCIDENT_VALID_TTL_SECONDS if validation_result.get("valid") else INCIDENT_INVALID_TTL_SECONDS
+
+async def validate_incident(incident_id: str) -> Dict[str, Any]:
+    """ServiceNow incident validation through the TTL cache; concurrent lookups of one incident share a call."""
+    return await incident_validation_cache.get_or_load(
+        incident_id, lambda: call_servicenow_incident_validation_mock(incident_id), incident_validation_ttl
+    )
+
 async def validate_incident_for_modification(incident_id: Optional[str], operation: str):
     if not incident_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"ServiceNow Incident ID is required for {operation} operation.")
-    validation_result = await call_servicenow_incident_validation_mock(incident_id)
+    validation_result = await validate_incident(incident_id)
     if validation_result.get("error") or not validation_result.get("valid"):
         error_detail = validation_result.get("detail", "Incident validation failed or incident not approved.")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_detail)
     print(f"Incident {incident_id} validated successfully for {operation}.")
 
+def build_vip_list_query(current_user: User, environment: Optional[str] = None, owner: Optional[str] = None) -> Dict[str, Any]:
+    """Builds the entitlement-scoped MongoDB filter used by VIP listing endpoints."""
+    query: Dict[str, Any] = {}
+    if environment:
+        query["environment"] = environment
+    if owner:
+        query["owner"] = owner # Narrows within what the user may see; never widens it
+    return scope_query(query, vip_entitlement_filter(current_user))
+
+def duplicate_listener_error(vip_fqdn: Optional[str], port: Optional[int]) -> HTTPException:
+    """409 for a write rejected by the vip_fqdn_port_unique index."""
+    listener = f"{vip_fqdn}:{port}" if vip_fqdn and port else "this FQDN and port"
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"A VIP listening on {listener} already exists.")
+
+def build_vip_insert_document(vip_data: VipCreate, current_user: User) -> Dict[str, Any]:
+    """Builds the MongoDB document for a new VIP owned by the current user."""
+    vip_to_insert_data = vip_data.model_dump()
+    # Ensure any 'id' or '_id' from input payload is removed to let MongoDB generate it
+    vip_to_insert_data.pop("id", None)
+    vip_to_insert_data.pop("_id", None)
+
+    now = utc_now()
+    vip_to_insert_data["owner"] = current_user.username
+    vip_to_insert_data.update(search_fields(vip_to_insert_data["vip_fqdn"]))
+    vip_to_insert_data.update(vip_ip_fields(vip_to_insert_data))
+    vip_to_insert_data["created_at"] = now
+    vip_to_insert_data["updated_at"] = now
+    vip_to_insert_data["version"] = 1
+    return vip_to_insert_data
+
+def parse_vip_fields(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Turns a comma-separated ?fields= value into a MongoDB projection, or None for full documents."""
+    if not fields:
+        return None
+    projection: Dict[str, int] = {"_id": 1}
+    for name in (f.strip() for f in fields.split(",")):
+        if not name:
+            continue
+        if name in ("id", "_id"):
+            continue
+        if name not in VIP_PROJECTABLE_FIELDS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown VIP field in fields parameter: {name}")
+        projection[name] = 1
+    return projection
+
+async def _stream_vips_ndjson(cursor: motor.motor_asyncio.AsyncIOMotorCursor, projection: Optional[Dict[str, int]] = None) -> AsyncIterator[bytes]:
+    """Yields one JSON-encoded VIP per line as the Motor cursor produces them."""
+    async for vip in cursor:
+        if projection is None:
+            yield render_vip(vip) + b"\n"
+        else:
+            # The query also fetches version (for ETags); emit only the requested fields
+            yield render_sparse_vip({k: v for k, v in vip.items() if k in projection}) + b"\n"
+
 # --- API Endpoints ---
 @app.get("/health", tags=["Health"], summary="Health check for the LBaaS API")
 async def health_check():
     return {"status": "healthy", "service": "LBaaS API"}
 
-@app.post("/api/v1/vips", response_model=VipDB, status_code=status.HTTP_201_CREATED, tags=["VIPs"], summary="Create a new VIP")
+@app.post("/api/v1/vips", response_model=VipDB, status_code=status.HTTP_202_ACCEPTED, tags=["VIPs"], summary="Create a new VIP and queue its provisioning")
 async def create_vip(
     vip_data: VipCreate,
     current_user: User = Depends(get_current_active_user),
-    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the original response instead of creating a duplicate.")
 ):
     if current_user.role == "auditor":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Auditors cannot create VIPs.")
 
+    if idempotency_key is not None:
+        return await run_idempotent(
+            db_client, idempotency_key, f"create_vip:{current_user.username}",
+            vip_data.model_dump(mode="json"), lambda: insert_vip(vip_data, current_user, db_client)
+        )
+    return await insert_vip(vip_data, current_user, db_client)
+
+async def insert_vip(vip_data: VipCreate, current_user: User, db_client: motor.motor_asyncio.AsyncIOMotorClient) -> Response:
+    """
+    Inserts a new VIP, queues its provisioning job and returns the 202 response
+    (shared by plain and idempotent creates). IPAM, CMDB, translation and
+    deployment run on the provisioning workers; follow the Location header for progress.
+    """
     vips_collection = get_vips_collection(db_client)
-    
-    vip_to_insert_data = vip_data.model_dump()
-    # Ensure any 'id' or '_id' from input payload is removed to let MongoDB generate it
-    vip_to_insert_data.pop("id", None)
-    vip_to_insert_data.pop("_id", None)
-    
-    vip_to_insert_data["owner"] = current_user.username
-    vip_to_insert_data["created_at"] = datetime.now(timezone.utc)
-    vip_to_insert_data["updated_at"] = datetime.now(timezone.utc)
+    vip_to_insert_data = build_vip_insert_document(vip_data, current_user)
+    vip_to_insert_data["_id"] = ObjectId()
+    job = new_job_document(vip_to_insert_data["_id"], current_user.username)
+    vip_to_insert_data["provisioning_job_id"] = job["_id"]
 
-    insert_result = await vips_collection.insert_one(vip_to_insert_data)
-    
-    created_vip_doc = await vips_collection.find_one({"_id": insert_result.inserted_id})
-    if not created_vip_doc:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create and retrieve VIP after insertion.")
+    # VIP first: a worker that claims the job must find its VIP.
+    try:
+        await vips_collection.insert_one(vip_to_insert_data)
+    except DuplicateKeyError:
+        raise duplicate_listener_error(vip_to_insert_data["vip_fqdn"], vip_to_insert_data["port"])
+    try:
+        await get_jobs_collection(db_client).insert_one(job)
+    except BaseException:
+        await vips_collection.delete_one({"_id": vip_to_insert_data["_id"]})
+        raise
+    provisioning_workers.notify()
 
-    return VipDB(**created_vip_doc)
+    # The inserted document is exactly what we sent, so no read-back is needed.
+    return FastJSONResponse(
+        render_vip(vip_to_insert_data),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"/api/v1/provisioning-jobs/{job['_id']}"}
+    )
 
 @app.get("/api/v1/vips", response_model=List[VipDB], tags=["VIPs"], summary="List all VIPs")
 async def list_vips(
+    response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database),
+    environment: Optional[str] = None,
+    owner: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of VIPs to return in one page."),
+    after: Optional[str] = Query(None, description="Keyset cursor: return only VIPs that sort after this value (use X-Next-Cursor from the previous page)."),
+    stream: bool = Query(False, description="Stream every matching VIP as NDJSON instead of returning a single page."),
+    fields: Optional[str] = Query(None, description="Comma-separated list of VIP fields to return, e.g. vip_fqdn,vip_ip,environment,owner,updated_at."),
+    q: Optional[str] = Query(None, description="FQDN search: 'app1*' (prefix), '*.prod.ladc.davelab.net' (suffix) or 'ladc' (substring, 3+ characters)."),
+    cidr: Optional[str] = Query(None, description="Only VIPs whose vip_ip lies in this block, e.g. 10.10.0.0/16."),
+    pool_cidr: Optional[str] = Query(None, description="Only VIPs with a pool member in this block."),
+    if_none_match: Optional[str] = Header(None)
+):
+    vips_collection = get_vips_collection(db_client)
+    query = build_vip_list_query(current_user, environment, owner)
+    projection = parse_vip_fields(fields)
+    if q:
+        search_filter, _ = build_search_filter(q)
+        query.update(search_filter)
+    # Subnet filters become range scans over the integer IP key indexes
+    if cidr:
+        query.update(cidr_filter("vip_ip_key", cidr))
+    if pool_cidr:
+        query.update(cidr_filter("pool_ip_keys", pool_cidr, array=True))
+
+    if after and not q:
+        try:
+            query["_id"] = {"$gt": PyObjectId(after)}
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {after}")
+
+    # The version is always fetched for the collection ETag, then dropped from sparse output.
+    fetch_projection = {**projection, "version": 1} if projection is not None else None
+    if q:
+        # Searches are ranked over every match and paged on (search_rank, _id); see vip_search.py.
+        def vips_cursor(page_limit: Optional[int]):
+            return vips_collection.aggregate(search_pipeline(query, q, fetch_projection, after, page_limit), batchSize=STREAM_BATCH_SIZE)
+    else:
+        # Keyset pagination: _id is always indexed, so sorting on it and seeking past the
+        # last seen value is O(page) regardless of how deep into the collection we are.
+        def vips_cursor(page_limit: Optional[int]):
+            cursor = vips_collection.find(query, fetch_projection).sort("_id", 1)
+            return cursor.limit(page_limit) if page_limit else cursor.batch_size(STREAM_BATCH_SIZE)
+
+    if stream:
+        return StreamingResponse(_stream_vips_ndjson(vips_cursor(None), projection), media_type="application/x-ndjson")
+
+    # Fetch one extra document to learn whether another page exists without a count() round trip.
+    vips_list = await vips_cursor(limit + 1).to_list(length=limit + 1)
+    if len(vips_list) > limit:
+        vips_list = vips_list[:limit]
+        response.headers["X-Next-Cursor"] = rank_cursor(vips_list[-1]) if q else str(vips_list[-1]["_id"])
+
+    # Aggregate version of the page; checked before any validation or serialization work.
+    etag = collection_etag(vips_list, sorted(projection or {}), response.headers.get("X-Next-Cursor"))
+    response.headers["ETag"] = etag
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+
+    # Validate once and encode with orjson; returning a Response skips FastAPI's second
+    # response_model validation (sparse documents wouldn't satisfy VipDB anyway).
+    if projection is not None:
+        sparse_docs = [{k: v for k, v in vip.items() if k in projection} for vip in vips_list]
+        return FastJSONResponse(render_sparse_vips(sparse_docs), headers=dict(response.headers))
+    return FastJSONResponse(render_vips(vips_list), headers=dict(response.headers))
+
+@app.post("/api/v1/vips:batch", response_model=VipBatchResponse, tags=["VIPs"], summary="Create, update and delete VIPs in one request")
+async def batch_vips(
+    batch: VipBatchRequest,
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the original response instead of re-applying the batch.")
+):
+    if current_user.role == "auditor":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Auditors cannot modify VIPs.")
+
+    if idempotency_key is not None:
+        async def execute() -> Response:
+            return FastJSONResponse((await execute_vip_batch(batch, current_user, db_client)).model_dump(mode="json"))
+        return await run_idempotent(
+            db_client, idempotency_key, f"batch_vips:{current_user.username}", batch.model_dump(mode="json"), execute
+        )
+    return await execute_vip_batch(batch, current_user, db_client)
+
+async def execute_vip_batch(batch: VipBatchRequest, current_user: User, db_client: motor.motor_asyncio.AsyncIOMotorClient) -> VipBatchResponse:
+    """Validates and applies a VIP batch as one bulk_write (shared by plain and idempotent calls)."""
+    vips_collection = get_vips_collection(db_client)
+    results: List[Optional[VipBatchItemResult]] = [None] * len(batch.operations)
+
+    def fail(index: int, status_code: int, detail: str, vip_id: Optional[str] = None):
+        results[index] = VipBatchItemResult(
+            index=index, op=batch.operations[index].op, status="failed",
+            status_code=status_code, vip_id=vip_id, detail=detail
+        )
+
+    # 1. Parse target IDs for update/delete operations.
+    target_ids: Dict[int, ObjectId] = {}
+    for index, operation in enumerate(batch.operations):
+        if operation.op == "create":
+            continue
+        try:
+            target_ids[index] = PyObjectId(operation.vip_id)
+        except Exception:
+            fail(index, status.HTTP_400_BAD_REQUEST, f"Invalid VIP ID format: {operation.vip_id}", operation.vip_id)
+
+    # 2. Validate each distinct incident once and, 3. load every target VIP's ownership with a
+    # single query. Neither depends on the other, so they run concurrently.
+    incident_ids = sorted({batch.operations[i].servicenow_incident_id for i in target_ids})
+    incident_errors: Dict[str, str] = {}
+    write_filter = vip_entitlement_filter(current_user, write=True)
+    entitled: set = set()
+    existing: set = set() # Targets that exist but the user may not modify
+
+    async def check_incidents():
+        validations = await asyncio.gather(*(validate_incident(i) for i in incident_ids))
+        for incident_id, validation_result in zip(incident_ids, validations):
+            if validation_result.get("error") or not validation_result.get("valid"):
+                incident_errors[incident_id] = str(validation_result.get("detail", "Incident validation failed or incident not approved."))
+
+    async def load_targets():
+        # Only IDs come back: entitled targets first, then which of the rest exist at all (403 vs 404).
+        wanted = list(set(target_ids.values()))
+        cursor = vips_collection.find(scope_query({"_id": {"$in": wanted}}, write_filter), {"_id": 1})
+        async for vip in cursor:
+            entitled.add(vip["_id"])
+        if len(entitled) < len(wanted):
+            cursor = vips_collection.find({"_id": {"$in": [i for i in wanted if i not in entitled]}}, {"_id": 1})
+            async for vip in cursor:
+                existing.add(vip["_id"])
+
+    if target_ids:
+        await run_preflight({"incidents": check_incidents(), "ownership": load_targets()})
+
+    for index, obj_id in target_ids.items():
+        operation = batch.operations[index]
+        if operation.servicenow_incident_id in incident_errors:
+            fail(index, status.HTTP_400_BAD_REQUEST, incident_errors[operation.servicenow_incident_id], operation.vip_id)
+        elif obj_id in existing:
+            fail(index, status.HTTP_403_FORBIDDEN, "Not authorized to access this VIP", operation.vip_id)
+        elif obj_id not in entitled:
+            fail(index, status.HTTP_404_NOT_FOUND, "VIP not found", operation.vip_id)
+
+    # 4. Build the bulk_write request from every operation that passed validation.
+    # In ordered mode nothing after the first failed operation is executed.
+    first_failure = next((i for i, r in enumerate(results) if r is not None), None)
+    jobs: Dict[int, Dict[str, Any]] = {} # Provisioning jobs for create operations, by operation index
+    requests = []
+    request_index: List[int] = []
+    for index, operation in enumerate(batch.operations):
+        if results[index] is not None:
+            continue
+        if batch.ordered and first_failure is not None and index > first_failure:
+            results[index] = VipBatchItemResult(index=index, op=operation.op, status="skipped", status_code=status.HTTP_424_FAILED_DEPENDENCY,
+                                                vip_id=getattr(operation, "vip_id", None), detail=f"Skipped after failure of operation {first_failure}")
+            continue
+        if operation.op == "create":
+            document = build_vip_insert_document(operation.vip, current_user)
+            document["_id"] = ObjectId() # Pre-assign so the result can report the new ID
+            jobs[index] = new_job_document(document["_id"], current_user.username)
+            document["provisioning_job_id"] = jobs[index]["_id"]
+            requests.append(InsertOne(document))
+            results[index] = VipBatchItemResult(index=index, op="create", status="created", status_code=status.HTTP_202_ACCEPTED, vip_id=str(document["_id"]))
+        elif operation.op == "update":
+            update_data = operation.vip.model_dump(exclude_unset=True)
+            update_data["updated_at"] = utc_now()
+            if update_data.get("vip_fqdn"):
+                update_data.update(search_fields(update_data["vip_fqdn"]))
+            update_data.update(vip_ip_fields(update_data))
+            requests.append(UpdateOne(scope_query({"_id": target_ids[index]}, write_filter), {"$set": update_data, "$inc": {"version": 1}}))
+            results[index] = VipBatchItemResult(index=index, op="update", status="updated", status_code=status.HTTP_200_OK, vip_id=operation.vip_id)
+        else:
+            requests.append(DeleteOne(scope_query({"_id": target_ids[index]}, write_filter)))
+            results[index] = VipBatchItemResult(index=index, op="delete", status="deleted", status_code=status.HTTP_204_NO_CONTENT, vip_id=operation.vip_id)
+        request_index.append(index)
+
+    response = VipBatchResponse(ordered=batch.ordered, results=[])
+    for index in request_index:
+        if index in target_ids:
+            vip_cache.invalidate(target_ids[index])
+    if requests:
+        failed_positions = set()
+        try:
+            bulk_result = await vips_collection.bulk_write(requests, ordered=batch.ordered)
+            bulk_details = bulk_result.bulk_api_result
+        except BulkWriteError as e:
+            bulk_details = e.details
+            for write_error in bulk_details.get("writeErrors", []):
+                position = write_error["index"]
+                failed_positions.add(position)
+                code = status.HTTP_409_CONFLICT if write_error.get("code") == 11000 else status.HTTP_500_INTERNAL_SERVER_ERROR
+                fail(request_index[position], code, write_error.get("errmsg", "Write failed"), results[request_index[position]].vip_id)
+            if batch.ordered and failed_positions:
+                # An ordered bulk_write stops at its first error; later writes never ran.
+                first_error = min(failed_positions)
+                for position in range(first_error + 1, len(request_index)):
+                    item = results[request_index[position]]
+                    results[request_index[position]] = item.model_copy(update={
+                        "status": "skipped", "status_code": status.HTTP_424_FAILED_DEPENDENCY,
+                        "detail": f"Skipped after failure of operation {request_index[first_error]}"
+                    })
+        response.inserted_count = bulk_details.get("nInserted", 0)
+        response.modified_count = bulk_details.get("nModified", 0)
+        response.deleted_count = bulk_details.get("nRemoved", 0)
+
+        # A filtered update/delete that matches nothing is not a write error, so the per-item
+        # results are checked against the matched/removed counts.
+        executed = [index for index in request_index if results[index].status not in ("failed", "skipped")]
+        await reconcile_batch_misses(
+            vips_collection, current_user, batch, target_ids, executed, results,
+            bulk_details.get("nMatched", 0), bulk_details.get("nRemoved", 0)
+        )
+
+    # Queue provisioning for every VIP that was actually inserted.
+    created = [index for index in jobs if results[index].status == "created"]
+    if created:
+        try:
+            await get_jobs_collection(db_client).insert_many([jobs[index] for index in created], ordered=False)
+            queued = set(created)
+        except BaseException as e:
+            queued = set()
+            if isinstance(e, BulkWriteError):
+                failed_jobs = {write_error["index"] for write_error in e.details.get("writeErrors", [])}
+                queued = {index for position, index in enumerate(created) if position not in failed_jobs}
+            # Same rule as create_vip: a VIP without its job would never be provisioned.
+            unqueued = [index for index in created if index not in queued]
+            await get_jobs_collection(db_client).delete_many({"_id": {"$in": [jobs[index]["_id"] for index in unqueued]}})
+            await vips_collection.delete_many({"_id": {"$in": [jobs[index]["vip_id"] for index in unqueued]}})
+            response.inserted_count -= len(unqueued)
+            for index in unqueued:
+                fail(index, status.HTTP_500_INTERNAL_SERVER_ERROR, "Could not queue provisioning; the VIP was not created", results[index].vip_id)
+            if not isinstance(e, Exception):
+                raise
+        if queued:
+            provisioning_workers.notify()
+
+    response.results = results
+    return response
+
+async def reconcile_batch_misses(vips_collection: motor.motor_asyncio.AsyncIOMotorCollection, current_user: User, batch: VipBatchRequest,
+                                 target_ids: Dict[int, ObjectId], executed: List[int], results: List[Optional[VipBatchItemResult]],
+                                 matched: int, removed: int):
+    """Marks executed updates/deletes as failed when the bulk_write counts show some matched nothing.
+
+    MongoDB only reports totals, so when they fall short every target is re-read: gone is 404,
+    no longer ours is 403, and a delete of a VIP that still exists is a 409. A VIP gone after the
+    write may have been removed by someone else before or after ours, so it is reported as not
+    found rather than claimed as a success.
+    """
+    updates = [index for index in executed if batch.operations[index].op == "update"]
+    deletes = [index for index in executed if batch.operations[index].op == "delete"]
+    if len(updates) <= matched and len(deletes) <= removed:
+        return
+    current = {}
+    cursor = vips_collection.find({"_id": {"$in": list({target_ids[i] for i in updates + deletes})}},
+                                  {"owner": 1, "secondary_contact_email": 1, "app_id": 1})
+    async for vip in cursor:
+        current[vip["_id"]] = vip
+
+    def miss(index: int, status_code: int, detail: str):
+        results[index] = results[index].model_copy(update={"status": "failed", "status_code": status_code, "detail": detail})
+
+    def miss_unless_writable(index: int, vip: Optional[Dict[str, Any]]) -> bool:
+        if vip is None:
+            miss(index, status.HTTP_404_NOT_FOUND, "VIP not found")
+        elif not vip_entitled(vip, current_user, write=True):
+            miss(index, status.HTTP_403_FORBIDDEN, "Not authorized to access this VIP")
+        else:
+            return False
+        return True
+
+    if len(updates) > matched:
+        for index in updates:
+            miss_unless_writable(index, current.get(target_ids[index]))
+    if len(deletes) > removed:
+        seen: set = set()
+        gone: List[int] = [] # First delete of each VIP that no longer exists: ours, or someone else's
+        shortfall = len(deletes) - removed
+        for index in deletes:
+            obj_id = target_ids[index]
+            if obj_id in seen:
+                miss(index, status.HTTP_404_NOT_FOUND, "VIP already deleted by an earlier operation in this batch")
+                shortfall -= 1
+            elif obj_id in current:
+                if not miss_unless_writable(index, current[obj_id]):
+                    miss(index, status.HTTP_409_CONFLICT, "VIP was modified concurrently and not deleted")
+                shortfall -= 1
+            else:
+                gone.append(index)
+            seen.add(obj_id)
+        if shortfall > 0:
+            for index in gone:
+                miss(index, status.HTTP_404_NOT_FOUND, "VIP not found")
+
+@app.get("/api/v1/vips/stats", response_model=VipStats, tags=["VIPs"], summary="VIP counts by environment, datacenter, protocol and owner")
+async def vip_stats(
     current_user: User = Depends(get_current_active_user),
     db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database),
     environment: Optional[str] = None,
     owner: Optional[str] = None
 ):
+    # Same role scoping as list_vips, so users only count what they could list.
+    query = build_vip_list_query(current_user, environment, owner)
+    cache_key = repr(sorted(query.items()))
+    cached = vip_stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    def group_by(field: str) -> List[Dict[str, Any]]:
+        return [
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$project": {"_id": 0, "key": "$_id", "count": 1}},
+        ]
+
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "by_environment": group_by("environment"),
+            "by_datacenter": group_by("datacenter"),
+            "by_protocol": group_by("protocol"),
+            # Bounded so the response stays small however many owners exist
+            "top_owners": group_by("owner") + [{"$limit": VIP_STATS_TOP_OWNERS}],
+        }},
+    ]
     vips_collection = get_vips_collection(db_client)
-    query: Dict[str, Any] = {}
-    if environment:
-        query["environment"] = environment
-    
-    if current_user.role == "user":
-        query["owner"] = current_user.username if not owner else owner 
-    elif owner: 
-        query["owner"] = owner
-        
-    cursor = vips_collection.find(query)
-    vips_list = await cursor.to_list(length=1000) 
-    return [VipDB(**vip) for vip in vips_list]
+    facets = (await vips_collection.aggregate(pipeline).to_list(length=1))[0]
+    total = facets.pop("total")
+    stats = VipStats(total=total[0]["count"] if total else 0, **facets)
+    vip_stats_cache.set(cache_key, stats)
+    return stats
 
 @app.get("/api/v1/vips/{vip_id}", response_model=VipDB, tags=["VIPs"], summary="Get a specific VIP by ID")
 async def get_vip(
     vip_id: str,
     current_user: User = Depends(get_current_active_user),
-    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database),
+    fields: Optional[str] = Query(None, description="Comma-separated list of VIP fields to return."),
+    if_none_match: Optional[str] = Header(None)
 ):
-    if current_user.role == "auditor":
+    projection = parse_vip_fields(fields)
+    if projection is not None:
         vips_collection = get_vips_collection(db_client)
         try:
             obj_id = PyObjectId(vip_id)
         except Exception:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid VIP ID format: {vip_id}")
-        vip = await vips_collection.find_one({"_id": obj_id})
+        # The version is always fetched for the ETag, then dropped if not requested.
+        vip = await vips_collection.find_one(
+            scope_query({"_id": obj_id}, vip_entitlement_filter(current_user)), {**projection, "version": 1}
+        )
         if not vip:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="VIP not found")
-        return VipDB(**vip)
-    
-    return await check_ownership_or_admin(vip_id, current_user, db_client)
+            await raise_vip_not_visible(vips_collection, obj_id)
+        etag = vip_etag(vip["_id"], vip.get("version"))
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        vip = {k: v for k, v in vip.items() if k in projection}
+        return FastJSONResponse(render_sparse_vip(vip), headers={"ETag": etag})
+
+    vip_db = await check_ownership_or_admin(vip_id, current_user, db_client)
+
+    etag = vip_etag(vip_db.id, vip_db.version)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return FastJSONResponse(render_vip(vip_db), headers={"ETag": etag})
 
 @app.put("/api/v1/vips/{vip_id}", response_model=VipDB, tags=["VIPs"], summary="Update an existing VIP")
 async def update_vip(
@@ -152,75 +660,298 @@ async def update_vip(
     vip_update_data: VipUpdate, 
     current_user: User = Depends(get_current_active_user),
     db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database),
-    servicenow_incident_id: Optional[str] = Body(None, description="ServiceNow Incident ID for change validation")
+    servicenow_incident_id: Optional[str] = Body(None, description="ServiceNow Incident ID for change validation"),
+    expected_version: Optional[int] = Body(None, description="Apply the update only if the VIP is still at this version (409 otherwise)."),
+    if_match: Optional[str] = Header(None)
 ):
     if current_user.role == "auditor":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Auditors cannot update VIPs.")
 
-    await validate_incident_for_modification(servicenow_incident_id, "update")
-    
-    await check_ownership_or_admin(vip_id, current_user, db_client) 
     vips_collection = get_vips_collection(db_client)
     try:
         obj_id = PyObjectId(vip_id)
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid VIP ID format: {vip_id}")
 
+    # Ownership is enforced by the write's own filter (and explained by raise_vip_write_failure when
+    # it matches nothing), so the only check before the write is the incident.
+    preflight = await run_preflight({
+        "incident": validate_incident_for_modification(servicenow_incident_id, "update"),
+    })
+
     update_data = vip_update_data.model_dump(exclude_unset=True)
-    update_data["updated_at"] = datetime.now(timezone.utc)
+    update_data["updated_at"] = utc_now()
+    if update_data.get("vip_fqdn"):
+        update_data.update(search_fields(update_data["vip_fqdn"]))
+    update_data.update(vip_ip_fields(update_data))
 
-    updated_vip_doc = await vips_collection.find_one_and_update(
-        {"_id": obj_id},
-        {"$set": update_data},
-        return_document=ReturnDocument.AFTER
-    )
+    # Ownership and the expected version (If-Match / expected_version) are part of the filter,
+    # so the checks and the write are one atomic compare-and-swap.
+    try:
+        updated_vip_doc = await vips_collection.find_one_and_update(
+            scope_query({"_id": obj_id, **version_filter(obj_id, if_match, expected_version)}, vip_entitlement_filter(current_user, write=True)),
+            {"$set": update_data, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise duplicate_listener_error(update_data.get("vip_fqdn"), update_data.get("port"))
 
+    # Evict locally right away; other replicas are invalidated by the change stream.
+    vip_cache.invalidate(obj_id)
     if not updated_vip_doc:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="VIP not found after update attempt")
+        conflict_status = status.HTTP_409_CONFLICT if expected_version is not None else status.HTTP_412_PRECONDITION_FAILED
+        await raise_vip_write_failure(vips_collection, obj_id, current_user, conflict_status)
     
-    return VipDB(**updated_vip_doc)
+    return FastJSONResponse(render_vip(updated_vip_doc), headers={
+        "ETag": vip_etag(updated_vip_doc["_id"], updated_vip_doc.get("version")),
+        "Server-Timing": preflight.server_timing()
+    })
 
 @app.delete("/api/v1/vips/{vip_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["VIPs"], summary="Delete a VIP")
 async def delete_vip(
     vip_id: str, 
     payload: VipDeletePayload, # Changed to use Pydantic model for body
+    response: Response,
     current_user: User = Depends(get_current_active_user),
-    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database),
+    if_match: Optional[str] = Header(None)
 ):
     if current_user.role == "auditor":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Auditors cannot delete VIPs.")
 
-    # Extract servicenow_incident_id from the payload model
-    servicenow_incident_id = payload.servicenow_incident_id
-    await validate_incident_for_modification(servicenow_incident_id, "delete")
-
-    await check_ownership_or_admin(vip_id, current_user, db_client) 
     vips_collection = get_vips_collection(db_client)
     try:
         obj_id = PyObjectId(vip_id)
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid VIP ID format: {vip_id}")
-    
-    delete_result = await vips_collection.delete_one({"_id": obj_id})
+
+    # Extract servicenow_incident_id from the payload model
+    servicenow_incident_id = payload.servicenow_incident_id
+    preflight = await run_preflight({
+        "incident": validate_incident_for_modification(servicenow_incident_id, "delete"),
+    })
+    response.headers["Server-Timing"] = preflight.server_timing()
+
+    delete_result = await vips_collection.delete_one(
+        scope_query({"_id": obj_id, **version_filter(obj_id, if_match)}, vip_entitlement_filter(current_user, write=True))
+    )
+    vip_cache.invalidate(obj_id)
     if delete_result.deleted_count == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="VIP not found or already deleted")
+        await raise_vip_write_failure(vips_collection, obj_id, current_user)
 
     return 
 
+async def find_pool_member_impact(ips: List[str], current_user: User, db_client: motor.motor_asyncio.AsyncIOMotorClient) -> List[PoolMemberImpact]:
+    """Maps backend server IPs to the VIPs and LB configurations that front them."""
+    normalized: List[str] = []
+    for ip in ips:
+        try:
+            normalized.append(str(ipaddress.ip_address(ip.strip())))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid IP address: {ip}")
+    unique_ips = list(dict.fromkeys(normalized))
+
+    # Both lookups are multikey index scans and independent of each other.
+    vip_query = {**build_vip_list_query(current_user), "pool.ip": {"$in": unique_ips}}
+    config_query: Dict[str, Any] = {"standard_config.pools.members.ip_address": {"$in": unique_ips}}
+    if current_user.role == "user":
+        # Configurations carry no owner; scope plain users to what they created or last updated.
+        config_query["$or"] = [{"created_by": current_user.username}, {"updated_by": current_user.username}]
+    vip_docs, config_docs = await asyncio.gather(
+        get_vips_collection(db_client).find(
+            vip_query, {"vip_fqdn": 1, "vip_ip": 1, "port": 1, "environment": 1, "datacenter": 1, "owner": 1, "pool": 1}
+        ).to_list(length=None),
+        get_configs_collection(db_client).find(
+            config_query, {"vip_id": 1, "environment": 1, "datacenter": 1, "lb_type": 1, "standard_config.pools.members.ip_address": 1}
+        ).to_list(length=None),
+    )
+
+    impact = {ip: PoolMemberImpact(ip=ip, vips=[], configs=[]) for ip in unique_ips}
+    for vip in vip_docs:
+        members_by_ip: Dict[str, List[Dict[str, Any]]] = {}
+        for member in vip.get("pool") or []:
+            if member.get("ip") in impact:
+                members_by_ip.setdefault(member["ip"], []).append(member)
+        for ip, members in members_by_ip.items():
+            impact[ip].vips.append(PoolMemberVipMatch(
+                id=str(vip["_id"]), vip_fqdn=vip.get("vip_fqdn", ""), vip_ip=vip.get("vip_ip"), port=vip.get("port"),
+                environment=vip.get("environment"), datacenter=vip.get("datacenter"), owner=vip.get("owner"),
+                members=[PoolMember(**m) for m in members]
+            ))
+    for config in config_docs:
+        member_ips = {
+            member.get("ip_address")
+            for pool in (config.get("standard_config") or {}).get("pools") or []
+            for member in pool.get("members") or []
+        }
+        for ip in member_ips & impact.keys():
+            impact[ip].configs.append(PoolMemberConfigMatch(
+                config_id=str(config["_id"]), vip_id=str(config.get("vip_id")), environment=config.get("environment"),
+                datacenter=config.get("datacenter"), lb_type=config.get("lb_type")
+            ))
+    return list(impact.values())
+
+@app.get("/api/v1/pool-members/{ip}/vips", response_model=PoolMemberImpact, tags=["Pool Members"], summary="VIPs and configurations that use a backend server")
+async def get_pool_member_vips(
+    ip: str,
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+):
+    return (await find_pool_member_impact([ip], current_user, db_client))[0]
+
+@app.post("/api/v1/pool-members:lookup", response_model=List[PoolMemberImpact], tags=["Pool Members"], summary="Map many backend servers to affected VIPs in one call")
+async def lookup_pool_members(
+    lookup: PoolMemberLookupRequest,
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+):
+    return await find_pool_member_impact(lookup.ips, current_user, db_client)
+
+async def load_provisioning_job(job_id: str, current_user: User, db_client: motor.motor_asyncio.AsyncIOMotorClient) -> Dict[str, Any]:
+    try:
+        obj_id = PyObjectId(job_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid job ID format: {job_id}")
+    jobs_collection = get_jobs_collection(db_client)
+    job = await jobs_collection.find_one(scope_query({"_id": obj_id}, job_entitlement_filter(current_user)))
+    if not job:
+        if await jobs_collection.find_one({"_id": obj_id}, {"_id": 1}):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this provisioning job")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Provisioning job not found")
+    return job
+
+@app.get("/api/v1/provisioning-jobs/{job_id}", response_model=ProvisioningJob, tags=["Provisioning"], summary="Status of a VIP provisioning job and its steps")
+async def get_provisioning_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+):
+    return ProvisioningJob(**await load_provisioning_job(job_id, current_user, db_client))
+
+@app.post("/api/v1/provisioning-jobs/{job_id}:retry", response_model=ProvisioningJob, status_code=status.HTTP_202_ACCEPTED, tags=["Provisioning"], summary="Re-queue a failed provisioning job")
+async def retry_provisioning_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+):
+    if current_user.role == "auditor":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Auditors cannot retry provisioning jobs.")
+    job = await load_provisioning_job(job_id, current_user, db_client)
+    # Succeeded steps are kept, so the retry resumes at the step that failed.
+    retried = await get_jobs_collection(db_client).find_one_and_update(
+        scope_query({"_id": job["_id"], "state": "failed"}, job_entitlement_filter(current_user)),
+        {"$set": {"state": "queued", "attempts": 0, "run_after": utc_now(), "updated_at": utc_now()}, "$unset": {"finished_at": ""}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not retried:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Only failed jobs can be retried; job is {job['state']}.")
+    provisioning_workers.notify()
+    return ProvisioningJob(**retried)
+
+@app.get("/api/v1/admin/indexes/stats", tags=["Admin"], summary="Index usage statistics for the managed collections")
+async def index_usage_stats(
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view index statistics.")
+    # Counters reset on mongod restart; an index with ops == 0 over a long window is a removal candidate.
+    return await get_index_stats(db_client)
+
+@app.get("/api/v1/admin/cache/stats", tags=["Admin"], summary="VIP read-through, incident validation and verified-token cache statistics")
+async def vip_cache_stats(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view cache statistics.")
+    return {**vip_cache.stats(), "incident_validation": incident_validation_cache.stats(), "verified_tokens": verified_token_cache.stats(), "api_keys": api_key_cache.stats()}
+
+@app.get("/api/v1/admin/http-clients/stats", tags=["Admin"], summary="Connection pools, circuit breakers and retry budget of the outbound integration clients")
+async def http_client_stats(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view HTTP client statistics.")
+    return {**http_clients.stats(), "resilience": resilience.stats()}
+
+@app.get("/api/v1/admin/preflight/stats", tags=["Admin"], summary="Latency and failure counts of mutation pre-flight checks")
+async def preflight_check_stats(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view pre-flight statistics.")
+    return preflight_stats.stats()
+
+@app.get("/api/v1/admin/provisioning/stats", tags=["Admin"], summary="Provisioning queue depth and this replica's worker counters")
+async def provisioning_stats(
+    current_user: User = Depends(get_current_active_user),
+    db_client: motor.motor_asyncio.AsyncIOMotorClient = Depends(get_database)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view provisioning statistics.")
+    by_state = {}
+    async for bucket in get_jobs_collection(db_client).aggregate([{"$group": {"_id": "$state", "count": {"$sum": 1}}}]):
+        by_state[bucket["_id"]] = bucket["count"]
+    return {"jobs_by_state": by_state, "workers": provisioning_workers.stats()}
+
+@app.get("/api/v1/admin/startup/profile", tags=["Admin"], summary="Import and startup phase timings of this worker")
+async def startup_profile_report(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view the startup profile.")
+    return startup_profile.report()
+
+async def run_startup_maintenance(db_client: motor.motor_asyncio.AsyncIOMotorClient):
+    """Index creation and data backfills. Runs in the background so the worker serves requests immediately."""
+    try:
+        with startup_profile.phase("maintenance.ensure_indexes"):
+            ensured = await ensure_indexes(db_client)
+        print(f"MongoDB indexes ensured: {ensured}")
+        with startup_profile.phase("maintenance.backfill_search_fields"):
+            backfilled = await backfill_search_fields(get_vips_collection(db_client))
+        if backfilled:
+            print(f"Added FQDN search fields to {backfilled} existing VIPs.")
+        with startup_profile.phase("maintenance.backfill_vip_ip_keys"):
+            backfilled = await backfill_vip_ip_keys(get_vips_collection(db_client))
+        if backfilled:
+            print(f"Added integer IP keys to {backfilled} existing VIPs.")
+        with startup_profile.phase("maintenance.backfill_config_ip_keys"):
+            backfilled = await backfill_config_ip_keys(get_configs_collection(db_client))
+        if backfilled:
+            print(f"Added integer IP keys to {backfilled} existing LB configurations.")
+        with startup_profile.phase("maintenance.init_versions"):
+            versioned = await get_vips_collection(db_client).update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+            versioned_configs = await get_configs_collection(db_client).update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        if versioned.modified_count:
+            print(f"Initialized version on {versioned.modified_count} existing VIPs.")
+        if versioned_configs.modified_count:
+            print(f"Initialized version on {versioned_configs.modified_count} existing configurations.")
+    except Exception as e:
+        print(f"Startup maintenance failed: {e}")
+
 @app.on_event("startup")
 async def startup_db_client():
+    with startup_profile.phase("http_clients"):
+        http_clients.start()
     app.mongodb_client = await get_database() 
     app.mongodb = app.mongodb_client["lbaas_db"] 
     print("Attempting to connect to MongoDB at host.docker.internal...")
     try:
-        await app.mongodb_client.admin.command(	'ping'	)
+        with startup_profile.phase("mongodb_ping"):
+            await app.mongodb_client.admin.command(	'ping'	)
         print("Successfully connected to MongoDB!")
+        app.startup_maintenance = asyncio.create_task(run_startup_maintenance(app.mongodb_client))
     except Exception as e:
         print(f"MongoDB connection failed: {e}")
+    with startup_profile.phase("background_tasks"):
+        # Keeps the VIP cache coherent across replicas; the cache stays off until the stream is open.
+        app.vip_cache_watcher = asyncio.create_task(vip_cache.watch(get_vips_collection(app.mongodb_client)))
+        provisioning_workers.start(app.mongodb_client)
+    startup_profile.ready()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task_name in ("vip_cache_watcher", "startup_maintenance"):
+        task = getattr(app, task_name, None)
+        if task:
+            task.cancel()
+    await provisioning_workers.stop()
+    await http_clients.close()
+    password_hasher.shutdown()
+    close_config_storage()
     if hasattr(app, 'mongodb_client') and app.mongodb_client:
-        app.mongodb_client.close()
+        close_client()
         print("Disconnected from MongoDB.")
-
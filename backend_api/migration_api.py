@@ -1,33 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, List
-from mongodb_config_storage import LBaaSConfigStorage, LBMigration
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, status
+from typing import Dict, List, Optional
+from mongodb_config_storage import get_config_storage, LBMigration, ConfigVersionConflictError
 from auth import get_current_user, User  # Changed from models import User
 from models import PyObjectId  # Keep other imports from models
+from etag import digest_etag, epoch_millis, etag_matches, if_none_match_status
 
 # Initialize the router for migration API
 router = APIRouter(prefix="/migration", tags=["migration"])
 
-# Initialize storage (should be shared with main.py)
-config_storage = LBaaSConfigStorage("mongodb://mongodb:27017", "lbaas_db")
-migration_manager = LBMigration(config_storage)
+# Storage is shared with the other config APIs and connects on first use, not at import
+_migration_manager: Optional[LBMigration] = None
+
+def get_migration_manager() -> LBMigration:
+    global _migration_manager
+    config_storage = get_config_storage()
+    if _migration_manager is None or _migration_manager.config_storage is not config_storage:
+        _migration_manager = LBMigration(config_storage)
+    return _migration_manager
 
 @router.get("/lb-types")
 async def get_lb_types(current_user: User = Depends(get_current_user)):
     # Return available LB types
     return ["NGINX", "F5", "AVI"]
 
+# Preparing a plan only reads; GET is the cacheable form, POST is kept for existing clients
+@router.get("/prepare/{vip_id}")
 @router.post("/prepare/{vip_id}")
 async def prepare_migration(vip_id: str, target_lb_type: str,
-                           current_user: User = Depends(get_current_user)):
+                           response: Response,
+                           request: Request,
+                           current_user: User = Depends(get_current_user),
+                           if_none_match: Optional[str] = Header(None)):
     # Prepare migration plan
     try:
-        plan = migration_manager.prepare_migration(
+        plan = get_migration_manager().prepare_migration(
             vip_id=vip_id,
             target_lb_type=target_lb_type
         )
-        return plan
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    # The plan is a pure function of the source config version and the target
+    source_config = plan["source_config"]
+    etag = digest_etag(["migration", source_config.get("_id"), source_config.get("version"), epoch_millis(source_config.get("last_updated")), target_lb_type])
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=if_none_match_status(request.method), headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return plan
 
 @router.post("/compatibility-check")
 async def check_compatibility(source_lb_type: str, target_lb_type: str,
@@ -65,16 +83,20 @@ async def check_compatibility(source_lb_type: str, target_lb_type: str,
 
 @router.post("/execute")
 async def execute_migration(vip_id: str, migrated_config: Dict,
-                           target_lb_type: str, current_user: User = Depends(get_current_user)):
+                           target_lb_type: str, current_user: User = Depends(get_current_user),
+                           expected_version: Optional[int] = None):
     # Execute migration
     try:
-        config_id = migration_manager.execute_migration(
+        config_id = get_migration_manager().execute_migration(
             vip_id=vip_id,
             migrated_config=migrated_config,
             target_lb_type=target_lb_type,
-            user=current_user.username
+            user=current_user.username,
+            expected_version=expected_version
         )
         return {"config_id": config_id}
+    except ConfigVersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal, Union, Annotated
 from datetime import datetime, timezone # Ensure timezone is imported
 from bson import ObjectId # Added for potential direct use or validation
 
@@ -83,6 +83,8 @@ class VipDB(VipBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = Field(0, description="Document version, incremented on every update (used for optimistic concurrency).")
+    provisioning_job_id: Optional[PyObjectId] = Field(None, description="Job that provisions this VIP (see /api/v1/provisioning-jobs).")
 
     class Config:
         populate_by_name = True # Allows using alias _id for id field
@@ -94,6 +96,23 @@ class VipDB(VipBase):
         # For Pydantic V2, arbitrary_types_allowed is True by default if needed for ObjectId
         # but PyObjectId handles custom validation and serialization.
 
+# Lightweight response model for sparse fieldset reads (?fields=...).
+# Every field is optional so a projected MongoDB document validates as-is;
+# serialize with exclude_unset=True so only the projected fields go on the wire.
+class VipSparse(VipUpdate):
+    id: Optional[PyObjectId] = Field(None, alias="_id")
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    version: Optional[int] = None
+    provisioning_job_id: Optional[PyObjectId] = None
+
+    class Config:
+        populate_by_name = True
+        json_encoders = {
+            ObjectId: str,
+            datetime: lambda dt: dt.isoformat()
+        }
+
 # VipResponse can be an alias or a specific response model if different from VipDB
 # For now, let's assume API responses can use VipDB structure directly or a simplified one.
 # If VipResponse was intended to be different, it should be defined accordingly.
@@ -106,3 +125,107 @@ class VipDB(VipBase):
 
 class VipDeletePayload(BaseModel):
     servicenow_incident_id: str = Field(..., description="ServiceNow Incident ID for change validation during delete operation.")
+
+# --- Batch VIP operations (/api/v1/vips:batch) ---
+class VipBatchCreate(BaseModel):
+    op: Literal["create"] = "create"
+    vip: VipCreate
+
+class VipBatchUpdate(BaseModel):
+    op: Literal["update"] = "update"
+    vip_id: str = Field(..., description="ID of the VIP to update.")
+    vip: VipUpdate
+    servicenow_incident_id: str = Field(..., description="ServiceNow Incident ID for change validation during update operation.")
+
+class VipBatchDelete(VipDeletePayload):
+    op: Literal["delete"] = "delete"
+    vip_id: str = Field(..., description="ID of the VIP to delete.")
+
+VipBatchOperation = Annotated[Union[VipBatchCreate, VipBatchUpdate, VipBatchDelete], Field(discriminator="op")]
+
+class VipBatchRequest(BaseModel):
+    operations: List[VipBatchOperation] = Field(..., min_length=1, max_length=1000)
+    ordered: bool = Field(True, description="Stop at the first failing operation (True) or apply every valid operation (False).")
+
+class VipBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the operation in the request.")
+    op: str
+    status: str = Field(..., example="created", description="created, updated, deleted, failed or skipped.")
+    status_code: int = Field(..., example=201)
+    vip_id: Optional[str] = None
+    detail: Optional[str] = None
+
+class VipBatchResponse(BaseModel):
+    ordered: bool
+    inserted_count: int = 0
+    modified_count: int = 0
+    deleted_count: int = 0
+    results: List[VipBatchItemResult]
+
+# --- VIP inventory statistics (/api/v1/vips/stats) ---
+class VipStatsBucket(BaseModel):
+    key: Optional[str] = Field(None, description="Grouping value, e.g. the environment name.")
+    count: int
+
+class VipStats(BaseModel):
+    total: int
+    by_environment: List[VipStatsBucket]
+    by_datacenter: List[VipStatsBucket]
+    by_protocol: List[VipStatsBucket]
+    top_owners: List[VipStatsBucket] = Field(..., description="Owners with the most VIPs, largest first.")
+
+# --- Pool member reverse lookup (/api/v1/pool-members) ---
+class PoolMemberVipMatch(BaseModel):
+    id: str = Field(..., description="VIP ID.")
+    vip_fqdn: str
+    vip_ip: Optional[str] = None
+    port: Optional[int] = None
+    environment: Optional[str] = None
+    datacenter: Optional[str] = None
+    owner: Optional[str] = None
+    members: List[PoolMember] = Field(..., description="Pool members of this VIP that matched the IP.")
+
+class PoolMemberConfigMatch(BaseModel):
+    config_id: str
+    vip_id: str
+    environment: Optional[str] = None
+    datacenter: Optional[str] = None
+    lb_type: Optional[str] = None
+
+class PoolMemberImpact(BaseModel):
+    ip: str
+    vips: List[PoolMemberVipMatch]
+    configs: List[PoolMemberConfigMatch]
+
+class PoolMemberLookupRequest(BaseModel):
+    ips: List[str] = Field(..., min_length=1, max_length=1024, example=["10.10.10.11", "10.10.10.12"])
+
+# --- Asynchronous provisioning (/api/v1/provisioning-jobs) ---
+class ProvisioningStep(BaseModel):
+    name: str = Field(..., example="ipam_reservation", description="ipam_reservation, cmdb_ci, translation or deployment.")
+    status: str = Field(..., example="succeeded", description="pending, running, succeeded or failed.")
+    attempts: int = 0
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class ProvisioningJob(BaseModel):
+    id: PyObjectId = Field(..., alias="_id")
+    vip_id: PyObjectId
+    owner: str
+    state: str = Field(..., example="running", description="queued, running, succeeded, failed or cancelled.")
+    current_step: Optional[str] = None
+    steps: List[ProvisioningStep]
+    attempts: int = Field(0, description="Times a worker has picked the job up.")
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
+        json_encoders = {
+            ObjectId: str,
+            datetime: lambda dt: dt.isoformat()
+        }
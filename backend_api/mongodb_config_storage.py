@@ -8,10 +8,44 @@ supporting vendor-agnostic storage, environment promotion, and migration.
 import json
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
 
 from common_lb_schema import CommonLBSchema
+from db import MONGO_DETAILS, DATABASE_NAME, CONFIG_COLLECTION_NAME
+from ip_keys import config_ip_fields, cidr_filter
+
+
+class ConfigVersionConflictError(Exception):
+    """Raised when a compare-and-swap write finds a different configuration version"""
+    
+    def __init__(self, vip_id: str, expected_version: int, current_version: Optional[int]):
+        self.vip_id = vip_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+        super().__init__(
+            f"Configuration for VIP {vip_id} is at version {current_version}, expected {expected_version}"
+        )
+
+
+# Shared by the promotion and migration APIs; created on first use, not at import
+_config_storage: Optional["LBaaSConfigStorage"] = None
+
+def get_config_storage() -> "LBaaSConfigStorage":
+    """Returns the process-wide configuration storage, connecting on first call."""
+    global _config_storage
+    if _config_storage is None:
+        # Same server and database as the Motor client, so startup maintenance (indexes,
+        # backfills) and config reads/writes see the same collection.
+        _config_storage = LBaaSConfigStorage(MONGO_DETAILS, DATABASE_NAME)
+    return _config_storage
+
+def close_config_storage() -> None:
+    global _config_storage
+    if _config_storage is not None:
+        _config_storage.client.close()
+        _config_storage = None
 
 
 class LBaaSConfigStorage:
@@ -27,14 +61,17 @@ class LBaaSConfigStorage:
         """
         self.client = MongoClient(mongo_uri)
         self.db = self.client[db_name]
-        self.configs = self.db.lb_configurations
+        self.configs = self.db[CONFIG_COLLECTION_NAME]
         
     def store_config(self, vip_id: str, standard_config: Dict, 
                     environment: str, datacenter: str, lb_type: str, 
-                    user: str) -> str:
+                    user: str, expected_version: Optional[int] = None) -> str:
         """
         Store a standardized configuration in MongoDB
         
+        Creates the configuration if it doesn't exist, otherwise updates it and
+        increments its version. Both cases are a single atomic operation.
+        
         Args:
             vip_id: VIP identifier
             standard_config: Standardized configuration dictionary
@@ -42,43 +79,65 @@ class LBaaSConfigStorage:
             datacenter: Datacenter (LADC, NYDC, UKDC)
             lb_type: Load balancer type (NGINX, F5, AVI)
             user: Username who created/updated the configuration
+            expected_version: Only update if the stored configuration is at this
+                version (compare-and-swap); 0 means it must not exist yet
             
         Returns:
             Configuration ID
+            
+        Raises:
+            ConfigVersionConflictError: If expected_version doesn't match
         """
-        # Check if configuration already exists
-        existing = self.configs.find_one({"vip_id": vip_id})
-        
-        if existing:
-            # Update existing configuration
-            result = self.configs.update_one(
-                {"vip_id": vip_id},
-                {
-                    "$set": {
-                        "standard_config": standard_config,
-                        "environment": environment,
-                        "datacenter": datacenter,
-                        "lb_type": lb_type,
-                        "last_updated": datetime.now(),
-                        "updated_by": user
-                    }
-                }
-            )
-            return str(existing["_id"])
-        else:
-            # Create new configuration
-            result = self.configs.insert_one({
-                "vip_id": vip_id,
+        now = datetime.now()
+        update = {
+            "$set": {
                 "standard_config": standard_config,
                 "environment": environment,
                 "datacenter": datacenter,
                 "lb_type": lb_type,
-                "created_at": datetime.now(),
-                "created_by": user,
-                "last_updated": datetime.now(),
-                "updated_by": user
-            })
+                "last_updated": now,
+                "updated_by": user,
+                **config_ip_fields(standard_config)
+            },
+            "$setOnInsert": {
+                "vip_id": vip_id,
+                "created_at": now,
+                "created_by": user
+            },
+            "$inc": {"version": 1}
+        }
+        
+        if expected_version is None:
+            result = self.configs.find_one_and_update(
+                {"vip_id": vip_id}, update, upsert=True,
+                projection={"_id": 1}, return_document=ReturnDocument.AFTER
+            )
+            return str(result["_id"])
+        
+        if expected_version == 0:
+            # Create-only: the unique vip_id index rejects a concurrent creator
+            try:
+                result = self.configs.insert_one({
+                    **update["$set"], **update["$setOnInsert"], "version": 1
+                })
+            except DuplicateKeyError:
+                raise ConfigVersionConflictError(vip_id, expected_version, self._current_version(vip_id))
             return str(result.inserted_id)
+        
+        # Documents stored before versioning get version 1 from the startup backfill
+        result = self.configs.find_one_and_update(
+            {"vip_id": vip_id, "version": expected_version},
+            update, projection={"_id": 1}, return_document=ReturnDocument.AFTER
+        )
+        if result is None:
+            raise ConfigVersionConflictError(vip_id, expected_version, self._current_version(vip_id))
+        return str(result["_id"])
+    
+    def _current_version(self, vip_id: str) -> Optional[int]:
+        current = self.configs.find_one({"vip_id": vip_id}, {"version": 1})
+        if current is None:
+            return None
+        return current.get("version")
     
     def get_config(self, vip_id: str) -> Optional[Dict]:
         """
@@ -132,6 +191,24 @@ class LBaaSConfigStorage:
         results = list(self.configs.find({"lb_type": lb_type}))
         return results
     
+    def get_configs_by_cidr(self, cidr: str, members: bool = False) -> List[Dict]:
+        """
+        Get all configurations whose VIP address (or a pool member) lies in a subnet
+        
+        Args:
+            cidr: CIDR block, e.g. 10.10.0.0/16
+            members: Match pool member addresses instead of the VIP address
+            
+        Returns:
+            List of configuration dictionaries
+        """
+        if members:
+            query = cidr_filter("member_ip_keys", cidr, array=True)
+        else:
+            query = cidr_filter("vip_ip_key", cidr)
+        results = list(self.configs.find(query))
+        return results
+    
     def delete_config(self, vip_id: str) -> bool:
         """
         Delete a configuration from MongoDB
@@ -207,7 +284,8 @@ class EnvironmentPromotion:
     
     def execute_promotion(self, vip_id: str, promoted_config: Dict, 
                          target_environment: str, target_datacenter: str, 
-                         target_lb_type: str, user: str) -> str:
+                         target_lb_type: str, user: str,
+                         expected_version: Optional[int] = None) -> str:
         """
         Execute the promotion of a configuration to a new environment
         
@@ -218,6 +296,8 @@ class EnvironmentPromotion:
             target_datacenter: Target datacenter (LADC, NYDC, UKDC)
             target_lb_type: Target load balancer type (NGINX, F5, AVI)
             user: Username executing the promotion
+            expected_version: Expected version of the target configuration
+                (0 to require that it doesn't exist yet)
             
         Returns:
             New configuration ID
@@ -234,7 +314,8 @@ class EnvironmentPromotion:
             environment=target_environment,
             datacenter=target_datacenter,
             lb_type=target_lb_type,
-            user=user
+            user=user,
+            expected_version=expected_version
         )
         
         return config_id
@@ -289,7 +370,8 @@ class LBMigration:
         }
     
     def execute_migration(self, vip_id: str, migrated_config: Dict, 
-                         target_lb_type: str, user: str) -> str:
+                         target_lb_type: str, user: str,
+                         expected_version: Optional[int] = None) -> str:
         """
         Execute the migration of a configuration to a new load balancer type
         
@@ -298,6 +380,7 @@ class LBMigration:
             migrated_config: Migrated configuration dictionary
             target_lb_type: Target load balancer type (NGINX, F5, AVI)
             user: Username executing the migration
+            expected_version: Expected version of the configuration being migrated
             
         Returns:
             Configuration ID
@@ -314,7 +397,8 @@ class LBMigration:
             environment=current_config.get("environment"),
             datacenter=current_config.get("datacenter"),
             lb_type=target_lb_type,
-            user=user
+            user=user,
+            expected_version=expected_version
         )
         
         return config_id
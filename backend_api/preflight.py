@@ -0,0 +1,103 @@
+"""
+Concurrent pre-flight checks for mutating endpoints.
+
+A mutation typically has to validate its ServiceNow incident and confirm the
+caller may touch the VIP before writing. Those checks don't depend on each
+other, so run_preflight() runs them together in a TaskGroup: the request waits
+for the slowest check rather than the sum of all of them, and the first check
+to fail cancels the rest and its exception (usually an HTTPException) is raised
+as-is.
+
+Each check's duration is returned for a Server-Timing header and accumulated in
+preflight_stats.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+
+class PreflightStats:
+    """Per-check call counts, failures and latency"""
+
+    def __init__(self):
+        self._checks: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, seconds: float, failed: bool) -> None:
+        entry = self._checks.setdefault(name, {"calls": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0})
+        ms = seconds * 1000
+        entry["calls"] += 1
+        entry["failures"] += int(failed)
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "calls": int(entry["calls"]),
+                "failures": int(entry["failures"]),
+                "avg_ms": round(entry["total_ms"] / entry["calls"], 2) if entry["calls"] else None,
+                "max_ms": round(entry["max_ms"], 2),
+            }
+            for name, entry in self._checks.items()
+        }
+
+
+preflight_stats = PreflightStats()
+
+
+class PreflightResult:
+    def __init__(self, results: Dict[str, Any], timings: Dict[str, float]):
+        self.results = results
+        self.timings = timings # seconds per check
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. 'incident;dur=41.2, ownership;dur=0.8'."""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings.items())
+
+
+async def run_preflight(checks: Dict[str, Awaitable[Any]]) -> PreflightResult:
+    """
+    Runs independent checks concurrently; raises the first failure after cancelling the others.
+
+    Args:
+        checks: Check name -> awaitable performing the check
+
+    Returns:
+        PreflightResult with each check's return value and duration
+    """
+    results: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    first_failure: Optional[BaseException] = None
+
+    async def timed(name: str, check: Awaitable[Any]) -> None:
+        nonlocal first_failure
+        started = time.perf_counter()
+        try:
+            results[name] = await check
+        except asyncio.CancelledError:
+            timings[name] = time.perf_counter() - started
+            raise
+        except BaseException as e:
+            timings[name] = time.perf_counter() - started
+            preflight_stats.record(name, timings[name], failed=True)
+            if first_failure is None:
+                first_failure = e
+            raise
+        timings[name] = time.perf_counter() - started
+        preflight_stats.record(name, timings[name], failed=False)
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            for name, check in checks.items():
+                group.create_task(timed(name, check))
+    except BaseExceptionGroup:
+        if first_failure is not None:
+            raise first_failure from None
+        raise
+    finally:
+        # A check cancelled before it started was never awaited; close it quietly.
+        for check in checks.values():
+            if asyncio.iscoroutine(check):
+                check.close()
+    return PreflightResult(results, timings)
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, List
-from mongodb_config_storage import LBaaSConfigStorage, EnvironmentPromotion
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, status
+from typing import Dict, List, Optional
+from mongodb_config_storage import get_config_storage, EnvironmentPromotion, ConfigVersionConflictError
 from auth import get_current_user, User  # Changed from models import User
 from models import PyObjectId  # Keep other imports from models
+from etag import digest_etag, epoch_millis, etag_matches, if_none_match_status
 
 # Initialize the router for promotion API
 router = APIRouter(prefix="/promotion", tags=["promotion"])
 
-# Initialize storage (should be shared with main.py)
-config_storage = LBaaSConfigStorage("mongodb://mongodb:27017", "lbaas_db")
-promotion_manager = EnvironmentPromotion(config_storage)
+# Storage is shared with the other config APIs and connects on first use, not at import
+_promotion_manager: Optional[EnvironmentPromotion] = None
+
+def get_promotion_manager() -> EnvironmentPromotion:
+    global _promotion_manager
+    config_storage = get_config_storage()
+    if _promotion_manager is None or _promotion_manager.config_storage is not config_storage:
+        _promotion_manager = EnvironmentPromotion(config_storage)
+    return _promotion_manager
 
 @router.get("/environments")
 async def get_environments(current_user: User = Depends(get_current_user)):
@@ -21,36 +28,52 @@ async def get_datacenters(environment: str, current_user: User = Depends(get_cur
     # Return datacenters for environment
     return ["LADC", "NYDC", "UKDC"]
 
+# Preparing a plan only reads; GET is the cacheable form, POST is kept for existing clients
+@router.get("/prepare/{vip_id}")
 @router.post("/prepare/{vip_id}")
 async def prepare_promotion(vip_id: str, target_environment: str, 
                           target_datacenter: str, target_lb_type: str,
-                          current_user: User = Depends(get_current_user)):
+                          response: Response,
+                          request: Request,
+                          current_user: User = Depends(get_current_user),
+                          if_none_match: Optional[str] = Header(None)):
     # Prepare promotion plan
     try:
-        plan = promotion_manager.prepare_promotion(
+        plan = get_promotion_manager().prepare_promotion(
             vip_id=vip_id,
             target_environment=target_environment,
             target_datacenter=target_datacenter,
             target_lb_type=target_lb_type
         )
-        return plan
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    # The plan is a pure function of the source config version and the targets
+    source_config = plan["source_config"]
+    etag = digest_etag(["promotion", source_config.get("_id"), source_config.get("version"), epoch_millis(source_config.get("last_updated")),
+                        target_environment, target_datacenter, target_lb_type])
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=if_none_match_status(request.method), headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return plan
 
 @router.post("/execute")
 async def execute_promotion(vip_id: str, promoted_config: Dict,
                           target_environment: str, target_datacenter: str,
-                          target_lb_type: str, current_user: User = Depends(get_current_user)):
+                          target_lb_type: str, current_user: User = Depends(get_current_user),
+                          expected_version: Optional[int] = None):
     # Execute promotion
     try:
-        config_id = promotion_manager.execute_promotion(
+        config_id = get_promotion_manager().execute_promotion(
             vip_id=vip_id,
             promoted_config=promoted_config,
             target_environment=target_environment,
             target_datacenter=target_datacenter,
             target_lb_type=target_lb_type,
-            user=current_user.username
+            user=current_user.username,
+            expected_version=expected_version
         )
         return {"config_id": config_id}
+    except ConfigVersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
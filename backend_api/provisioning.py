@@ -0,0 +1,330 @@
+"""
+Asynchronous VIP provisioning pipeline.
+
+Creating a VIP records it in MongoDB and enqueues a provisioning job; the
+request returns 202 straight away. Jobs live in the provisioning_jobs
+collection and are executed by a pool of asyncio workers:
+
+    ipam_reservation -> cmdb_ci -> translation -> deployment
+
+Each step records its own status, attempts and result on the job document, so
+a job picked up again (after a failure, a restart or an expired lease) resumes
+at the first step that has not succeeded and can use the results of the steps
+before it.
+
+Workers claim jobs with an atomic find_one_and_update that takes a lease, so
+any number of workers across any number of processes can share the queue;
+throughput scales by running more of them (API replicas, or standalone
+`python provisioning.py` worker processes). A worker that dies mid-job simply
+lets its lease expire and another worker resumes the job.
+"""
+
+import asyncio
+import socket
+import uuid
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import motor.motor_asyncio
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from db import DATABASE_NAME, PROVISIONING_JOB_COLLECTION_NAME, get_vips_collection
+from etag import utc_now
+from integrations import call_tcpwave_ipam_mock, call_servicenow_cmdb_mock, call_translator_module
+from ip_keys import vip_ip_fields
+from models import VipBase
+from vip_cache import vip_cache
+
+PROVISIONING_STEPS = ("ipam_reservation", "cmdb_ci", "translation", "deployment")
+PROVISIONING_WORKERS_PER_REPLICA = 4
+JOB_LEASE_SECONDS = 120.0 # Longer than any single step; renewed before each step
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 5.0
+JOB_RETRY_MAX_SECONDS = 300.0
+WORKER_IDLE_POLL_SECONDS = 1.0
+CMDB_VIP_TABLE = "cmdb_ci_lb_service"
+DEFAULT_LB_VENDOR = "NGINX" # Until placement decides per datacenter
+# TCPwave subnet VIP addresses are allocated from, per datacenter
+DATACENTER_SUBNETS: Dict[str, str] = {
+    "LADC": "LADC-subnet",
+    "NYDC": "NYDC-subnet",
+}
+
+
+class ProvisioningStepError(Exception):
+    """A step failed; the job is retried with backoff until JOB_MAX_ATTEMPTS."""
+
+
+class ProvisioningConfigError(ProvisioningStepError):
+    """A step can never succeed for this VIP as configured; the job fails without retrying."""
+
+
+def get_jobs_collection(db_client: motor.motor_asyncio.AsyncIOMotorClient) -> motor.motor_asyncio.AsyncIOMotorCollection:
+    return db_client[DATABASE_NAME][PROVISIONING_JOB_COLLECTION_NAME]
+
+
+def new_job_document(vip_id: ObjectId, owner: str) -> Dict[str, Any]:
+    now = utc_now()
+    return {
+        "_id": ObjectId(),
+        "vip_id": vip_id,
+        "owner": owner,
+        "state": "queued",
+        "steps": [{"name": name, "status": "pending", "attempts": 0} for name in PROVISIONING_STEPS],
+        "attempts": 0,
+        "run_after": now,
+        "lease_owner": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _step_result(job: Dict[str, Any], name: str) -> Dict[str, Any]:
+    for step in job["steps"]:
+        if step["name"] == name:
+            return step.get("result") or {}
+    return {}
+
+
+def _check(response: Dict[str, Any], what: str) -> Dict[str, Any]:
+    if response.get("error"):
+        raise ProvisioningStepError(f"{what} failed: {response.get('detail')}")
+    return response
+
+
+# --- Steps ---
+# Each step receives the job and the current VIP document and returns a result
+# dict stored on the step. Steps must be safe to re-run after a crash that
+# happened before their result was recorded.
+
+async def step_ipam_reservation(db_client, job: Dict[str, Any], vip: Dict[str, Any]) -> Dict[str, Any]:
+    subnet_id = DATACENTER_SUBNETS.get(str(vip.get("datacenter", "")).upper())
+    if subnet_id is None:
+        raise ProvisioningConfigError(f"No IPAM subnet is configured for datacenter {vip.get('datacenter')!r}.")
+    if vip.get("vip_ip") and vip["vip_ip"] == job.get("allocated_ip"):
+        # An earlier attempt allocated this address but failed before its FQDN was registered.
+        _check(await call_tcpwave_ipam_mock("update_fqdn", {"ip_address": vip["vip_ip"], "new_fqdn": vip["vip_fqdn"]}), "FQDN registration")
+        return {"ip_address": vip["vip_ip"], "subnet_id": subnet_id, "allocated": True}
+    if vip.get("vip_ip"):
+        # Caller supplied the address: reserving it again is a no-op.
+        _check(await call_tcpwave_ipam_mock("reserve_ip", {"ip_address": vip["vip_ip"], "fqdn": vip["vip_fqdn"], "subnet_id": subnet_id}), "IP reservation")
+        return {"ip_address": vip["vip_ip"], "subnet_id": subnet_id, "allocated": False}
+
+    allocation = _check(await call_tcpwave_ipam_mock("request_ip", {"subnet_id": subnet_id}), "IP allocation")
+    ip_address = allocation["ip_address"]
+    # Record the address on the job and the VIP as soon as it is allocated, so a re-run (e.g. after
+    # the FQDN registration below fails) registers this address instead of allocating another.
+    await get_jobs_collection(db_client).update_one({"_id": job["_id"]}, {"$set": {"allocated_ip": ip_address}})
+    await get_vips_collection(db_client).update_one(
+        {"_id": vip["_id"]},
+        {"$set": {"vip_ip": ip_address, **vip_ip_fields({"vip_ip": ip_address}), "updated_at": utc_now()}, "$inc": {"version": 1}}
+    )
+    vip_cache.invalidate(vip["_id"])
+    vip["vip_ip"] = ip_address
+    _check(await call_tcpwave_ipam_mock("update_fqdn", {"ip_address": ip_address, "new_fqdn": vip["vip_fqdn"]}), "FQDN registration")
+    return {"ip_address": ip_address, "subnet_id": subnet_id, "allocated": True}
+
+
+async def step_cmdb_ci(db_client, job: Dict[str, Any], vip: Dict[str, Any]) -> Dict[str, Any]:
+    name = f"{vip['vip_fqdn']}:{vip['port']}"
+    existing = await call_servicenow_cmdb_mock("query_cis", CMDB_VIP_TABLE, query=f"name={name}")
+    if isinstance(existing, list) and existing:
+        # Created by an earlier attempt whose result was not recorded
+        return {"sys_id": existing[0]["sys_id"], "created": False}
+    created = _check(await call_servicenow_cmdb_mock("create_ci", CMDB_VIP_TABLE, payload={
+        "name": name,
+        "ip_address": vip.get("vip_ip"),
+        "port": vip["port"],
+        "environment": vip["environment"],
+        "datacenter": vip["datacenter"],
+        "app_id": vip["app_id"],
+        "owner": vip["owner"],
+        "vip_id": str(vip["_id"]),
+    }), "CMDB CI creation")
+    return {"sys_id": created["sys_id"], "created": True}
+
+
+async def step_translation(db_client, job: Dict[str, Any], vip: Dict[str, Any]) -> Dict[str, Any]:
+    translated = _check(await call_translator_module(DEFAULT_LB_VENDOR, VipBase(**vip), "translate"), "Translation")
+    return {"vendor": DEFAULT_LB_VENDOR, "config": translated.get("config_generated")}
+
+
+async def step_deployment(db_client, job: Dict[str, Any], vip: Dict[str, Any]) -> Dict[str, Any]:
+    vendor = _step_result(job, "translation").get("vendor", DEFAULT_LB_VENDOR)
+    deployed = _check(await call_translator_module(vendor, VipBase(**vip), "deploy"), "Deployment")
+    return {"vendor": vendor, "message": deployed.get("message")}
+
+
+STEP_HANDLERS: Dict[str, Callable[..., Awaitable[Dict[str, Any]]]] = {
+    "ipam_reservation": step_ipam_reservation,
+    "cmdb_ci": step_cmdb_ci,
+    "translation": step_translation,
+    "deployment": step_deployment,
+}
+
+
+# --- Workers ---
+def _retry_delay(attempts: int) -> float:
+    return min(JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX_SECONDS)
+
+
+class ProvisioningWorkerPool:
+    """Pool of asyncio workers draining the provisioning job queue"""
+
+    def __init__(self, concurrency: int = PROVISIONING_WORKERS_PER_REPLICA):
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self, db_client: motor.motor_asyncio.AsyncIOMotorClient) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(db_client)) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wakes idle workers in this process (jobs queued elsewhere are found by polling)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+    async def claim(self, jobs: motor.motor_asyncio.AsyncIOMotorCollection) -> Optional[Dict[str, Any]]:
+        """Leases the oldest runnable job: queued and due, or running with an expired lease."""
+        now = utc_now()
+        return await jobs.find_one_and_update(
+            {"state": {"$in": ["queued", "running"]}, "run_after": {"$lte": now}},
+            {"$set": {
+                "state": "running",
+                # Fresh token per claim, so a worker whose lease expired can't write over its successor
+                "lease_owner": f"{self.worker_id}:{uuid.uuid4().hex[:8]}",
+                "run_after": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "updated_at": now,
+            }, "$inc": {"attempts": 1}},
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self, db_client: motor.motor_asyncio.AsyncIOMotorClient) -> None:
+        jobs = get_jobs_collection(db_client)
+        while True:
+            try:
+                job = await self.claim(jobs)
+            except Exception as e:
+                print(f"Provisioning worker failed to claim a job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=WORKER_IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(db_client, jobs, job)
+            except Exception as e:
+                # Keep the worker alive; the job's lease expires and it is picked up again.
+                print(f"Provisioning worker failed while processing job {job['_id']}: {e}")
+
+    async def _update(self, jobs, job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+        # Only the current lease holder may write; a worker whose lease expired has lost the job.
+        result = await jobs.update_one({"_id": job["_id"], "lease_owner": job["lease_owner"]}, update)
+        return result.matched_count == 1
+
+    async def process(self, db_client: motor.motor_asyncio.AsyncIOMotorClient, jobs: motor.motor_asyncio.AsyncIOMotorCollection, job: Dict[str, Any]) -> None:
+        vip = await get_vips_collection(db_client).find_one({"_id": job["vip_id"]})
+        if vip is None:
+            await self._update(jobs, job, {"$set": {"state": "cancelled", "error": "VIP was deleted before provisioning finished.", "lease_owner": None, "finished_at": utc_now()}})
+            return
+
+        for index, step in enumerate(job["steps"]):
+            if step["status"] == "succeeded":
+                continue
+            now = utc_now()
+            if not await self._update(jobs, job, {
+                "$set": {
+                    f"steps.{index}.status": "running",
+                    f"steps.{index}.started_at": now,
+                    "current_step": step["name"],
+                    "run_after": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    "updated_at": now,
+                },
+                "$inc": {f"steps.{index}.attempts": 1}
+            }):
+                return
+            try:
+                result = await STEP_HANDLERS[step["name"]](db_client, job, vip)
+            except asyncio.CancelledError:
+                raise # Shutdown: the lease expires and another worker resumes this step
+            except Exception as e:
+                await self._fail_step(jobs, job, index, str(e), retry=not isinstance(e, ProvisioningConfigError))
+                return
+            step["status"] = "succeeded"
+            step["result"] = result
+            if not await self._update(jobs, job, {"$set": {
+                f"steps.{index}.status": "succeeded",
+                f"steps.{index}.result": result,
+                f"steps.{index}.finished_at": utc_now(),
+                f"steps.{index}.error": None,
+            }}):
+                return
+
+        if await self._update(jobs, job, {"$set": {"state": "succeeded", "current_step": None, "lease_owner": None, "error": None, "finished_at": utc_now(), "updated_at": utc_now()}}):
+            self.completed += 1
+
+    async def _fail_step(self, jobs, job: Dict[str, Any], index: int, error: str, retry: bool = True) -> None:
+        now = utc_now()
+        update: Dict[str, Any] = {
+            f"steps.{index}.status": "failed",
+            f"steps.{index}.error": error,
+            f"steps.{index}.finished_at": now,
+            "lease_owner": None,
+            "error": error,
+            "updated_at": now,
+        }
+        if not retry or job["attempts"] >= JOB_MAX_ATTEMPTS:
+            update.update({"state": "failed", "finished_at": now})
+            self.failed += 1
+        else:
+            # Back to the queue; the next attempt resumes at this step.
+            update.update({"state": "queued", "run_after": now + timedelta(seconds=_retry_delay(job["attempts"]))})
+            self.retried += 1
+        await self._update(jobs, job, {"$set": update})
+
+
+provisioning_workers = ProvisioningWorkerPool()
+
+
+async def _run_standalone_workers() -> None:
+    from db import get_database, close_client
+    from http_clients import http_clients
+    db_client = await get_database()
+    provisioning_workers.start(db_client)
+    print(f"Provisioning worker {provisioning_workers.worker_id} running {provisioning_workers.concurrency} workers.")
+    try:
+        await asyncio.gather(*provisioning_workers._tasks)
+    finally:
+        await provisioning_workers.stop()
+        await http_clients.close()
+        close_client()
+
+
+if __name__ == "__main__":
+    # Dedicated worker replica: python provisioning.py
+    asyncio.run(_run_standalone_workers())
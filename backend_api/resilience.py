@@ -0,0 +1,283 @@
+"""
+Resilience policies for outbound integration calls.
+
+Every call made through integrations._make_http_request runs under the policy
+of its upstream:
+
+- Circuit breaker (closed -> open -> half-open): after consecutive failures the
+  upstream is short-circuited for a cool-down period instead of having every
+  caller wait out its timeout; then a limited number of probe calls decide
+  whether to close it again.
+- Retries for idempotent requests, with exponential backoff and full jitter,
+  drawn from a retry budget shared by all upstreams so a broad outage can't
+  multiply load on the upstreams that are still healthy.
+- Optional hedging for idempotent reads: if the first attempt hasn't answered
+  within the hedge delay a second one is sent, and the first usable answer wins.
+- A deadline per call, covering every attempt and backoff.
+
+A failure is a transport error or a 5xx/429 response; other 4xx answers are the
+upstream working correctly and count as successes.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+RESILIENCE_SETTINGS: Dict[str, Dict[str, Any]] = {
+    # deadline: seconds for the whole call; hedge_delay: seconds before a hedged read sends its second attempt
+    "tcpwave": {"deadline": 5.0, "max_attempts": 3, "backoff_base": 0.1, "backoff_max": 1.0, "hedge_delay": 0.25,
+                "failure_threshold": 5, "open_seconds": 30.0, "half_open_max_calls": 1},
+    "servicenow": {"deadline": 5.0, "max_attempts": 3, "backoff_base": 0.1, "backoff_max": 1.0, "hedge_delay": 0.3,
+                   "failure_threshold": 5, "open_seconds": 30.0, "half_open_max_calls": 1},
+    "translator": {"deadline": 30.0, "max_attempts": 2, "backoff_base": 0.5, "backoff_max": 2.0, "hedge_delay": 2.0,
+                   "failure_threshold": 3, "open_seconds": 60.0, "half_open_max_calls": 1},
+}
+
+# Retries (and hedges) may add at most 10% to the request rate, plus a small floor for low traffic.
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MIN_PER_SECOND = 1.0
+RETRY_BUDGET_MAX_TOKENS = 20.0
+
+
+class CircuitOpenError(Exception):
+    """The upstream's circuit breaker is open; the call was not attempted."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"Circuit breaker for {upstream} is open; retry in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """The call's deadline passed before an attempt succeeded."""
+
+
+def is_retryable(response: httpx.Response) -> bool:
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open probing state"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, open_seconds: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._half_open_calls = 0
+        self._probe_started_at = 0.0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> None:
+        """Raises CircuitOpenError unless a call may go out now."""
+        if self.state == "open":
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = "half_open"
+            self._half_open_calls = 0
+        if self.state == "half_open":
+            now = time.monotonic()
+            if self._half_open_calls >= self.half_open_max_calls:
+                # A probe that never reported back (e.g. lost) must not hold the breaker half-open forever
+                probe_window_left = self._probe_started_at + self.open_seconds - now
+                if probe_window_left > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, probe_window_left)
+                self._half_open_calls = 0
+            self._half_open_calls += 1
+            self._probe_started_at = now
+
+    def release(self) -> None:
+        """Frees the probe slot of a call that ended without an outcome (cancelled)."""
+        if self.state == "half_open" and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        retry_after = max(self.opened_at + self.open_seconds - time.monotonic(), 0.0) if self.state == "open" else 0.0
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": round(retry_after, 1),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """Token bucket: every request deposits RETRY_BUDGET_RATIO tokens, every retry or hedge spends one"""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+                 max_tokens: float = RETRY_BUDGET_MAX_TOKENS):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._refilled_at = time.monotonic()
+        self.spent = 0
+        self.exhausted = 0
+
+    def _refill(self, amount: float = 0.0) -> None:
+        now = time.monotonic()
+        amount += (now - self._refilled_at) * self.min_per_second
+        self._refilled_at = now
+        self.tokens = min(self.tokens + amount, self.max_tokens)
+
+    def record_request(self) -> None:
+        self._refill(self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens < 1.0:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1.0
+        self.spent += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {"tokens": round(self.tokens, 2), "max_tokens": self.max_tokens, "spent": self.spent, "exhausted": self.exhausted}
+
+
+class UpstreamPolicy:
+    """Breaker, retry and hedging settings for one upstream"""
+
+    def __init__(self, name: str, settings: Dict[str, Any], budget: RetryBudget):
+        self.name = name
+        self.settings = settings
+        self.budget = budget
+        self.breaker = CircuitBreaker(name, settings["failure_threshold"], settings["open_seconds"], settings["half_open_max_calls"])
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadlines_exceeded = 0
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from many callers from arriving in lockstep
+        return random.uniform(0, min(self.settings["backoff_base"] * (2 ** (attempt - 1)), self.settings["backoff_max"]))
+
+    async def _hedged(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        pending: set = set()
+        try:
+            first = asyncio.create_task(send())
+            pending = {first}
+            done, pending = await asyncio.wait(pending, timeout=self.settings["hedge_delay"])
+            if done or not self.budget.try_spend():
+                return await first
+            self.hedges += 1
+            second = asyncio.create_task(send())
+            pending = {first, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and not is_retryable(task.result()):
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                if not pending:
+                    return task.result() # Both failed: surface the last outcome
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]], idempotent: bool,
+                   hedge: bool = False, deadline: Optional[float] = None) -> httpx.Response:
+        """
+        Runs send() under this upstream's policy.
+
+        Args:
+            send: Performs one attempt
+            idempotent: Whether the request may be retried/hedged
+            hedge: Send a second attempt if the first is slow (idempotent reads only)
+            deadline: Seconds for the whole call; defaults to the upstream's setting
+
+        Raises:
+            CircuitOpenError, DeadlineExceededError, httpx.RequestError
+        """
+        self.calls += 1
+        self.budget.record_request()
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline or self.settings["deadline"])
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.allow()
+            error: Optional[Exception] = None
+            response: Optional[httpx.Response] = None
+            try:
+                async with asyncio.timeout_at(deadline_at):
+                    response = await (self._hedged(send) if hedge and idempotent else send())
+            except TimeoutError:
+                self.breaker.record_failure()
+                self.deadlines_exceeded += 1
+                raise DeadlineExceededError(f"{self.name} did not answer within the call deadline")
+            except httpx.RequestError as e:
+                error = e
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            if response is not None and not is_retryable(response):
+                self.breaker.record_success()
+                return response
+            self.breaker.record_failure()
+
+            backoff = self._backoff(attempt)
+            if (not idempotent or attempt >= self.settings["max_attempts"]
+                    or loop.time() + backoff >= deadline_at or not self.budget.try_spend()):
+                if error is not None:
+                    raise error
+                return response
+            self.retries += 1
+            await asyncio.sleep(backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "upstream": self.name,
+            "breaker": self.breaker.stats(),
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "deadlines_exceeded": self.deadlines_exceeded,
+        }
+
+
+class ResilienceRegistry:
+    """One policy per upstream, sharing a single retry budget"""
+
+    def __init__(self, settings: Dict[str, Dict[str, Any]] = RESILIENCE_SETTINGS):
+        self.budget = RetryBudget()
+        self.policies = {name: UpstreamPolicy(name, upstream_settings, self.budget) for name, upstream_settings in settings.items()}
+
+    def get(self, upstream: str) -> UpstreamPolicy:
+        return self.policies[upstream]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"retry_budget": self.budget.stats(), "upstreams": [policy.stats() for policy in self.policies.values()]}
+
+
+resilience = ResilienceRegistry()
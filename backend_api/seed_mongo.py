@@ -1,10 +1,11 @@
 import asyncio
+import os
 import motor.motor_asyncio
 from datetime import datetime, timezone
 from bson import ObjectId # Use bson.ObjectId for creating _id values
 
 # --- Configuration ---
-MONGO_DETAILS = "mongodb://host.docker.internal:27017" # User's local MongoDB
+MONGO_DETAILS = os.getenv("MONGODB_URL", "mongodb://host.docker.internal:27017") # User's local MongoDB
 DB_NAME = "lbaas_db"
 VIPS_COLLECTION_NAME = "vips"
 
@@ -0,0 +1,98 @@
+"""
+VIP Response Serialization Micro-Benchmark
+
+Compares the original list_vips response path (VipDB(**doc) per document,
+FastAPI re-validating against response_model, then jsonable_encoder and
+json.dumps) with the fast path in fast_json.py (one TypeAdapter validation
+with trusted email fields, orjson encoding).
+
+Prints the time per response for each path and the resulting speed-up.
+Absolute figures depend heavily on the machine and the pydantic/orjson
+versions, so compare runs made on the same host.
+
+Usage:
+    python serialization_benchmark.py [vip_count] [iterations]
+"""
+
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import VipDB
+from fast_json import render_vips
+
+# FastAPI builds an equivalent validator for response_model=List[VipDB]
+baseline_adapter = TypeAdapter(List[VipDB])
+
+
+def create_vip_documents(count: int, pool_size: int = 8) -> List[Dict]:
+    """Create raw documents shaped like what Motor returns from the vips collection"""
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "vip_fqdn": f"app{i}.prod.ladc.davelab.net",
+            "vip_ip": f"10.10.{i // 250 % 250}.{i % 250 + 1}",
+            "app_id": f"APP{i % 50:03d}",
+            "environment": "Prod",
+            "datacenter": "LADC",
+            "primary_contact_email": "user1@example.com",
+            "secondary_contact_email": "user2@example.com",
+            "team_distribution_email": "team@example.com",
+            "monitor": {"type": "HTTP", "port": 8080, "send": "GET /health HTTP/1.1", "receive": "200 OK"},
+            "persistence": {"type": "source_ip", "timeout": 300},
+            "ssl_cert_name": f"app{i}.pem",
+            "mtls_ca_cert_name": None,
+            "pool": [{"ip": f"10.20.{i % 250}.{m + 1}", "port": 8080} for m in range(pool_size)],
+            "owner": "user1",
+            "port": 443,
+            "protocol": "HTTPS",
+            "lb_method": "ROUND_ROBIN",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def baseline_path(docs: List[Dict]) -> bytes:
+    """What list_vips did before: build models, FastAPI re-validates and encodes them"""
+    vips = [VipDB(**doc) for doc in docs]
+    revalidated = baseline_adapter.validate_python(vips)
+    payload = jsonable_encoder(revalidated, by_alias=True, custom_encoder={ObjectId: str})
+    return json.dumps(payload).encode()
+
+
+def fast_path(docs: List[Dict]) -> bytes:
+    return render_vips(docs)
+
+
+def time_path(name: str, func: Callable[[List[Dict]], bytes], docs: List[Dict], iterations: int) -> float:
+    func(docs) # Warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        body = func(docs)
+    elapsed = (time.perf_counter() - start) / iterations
+    print(f"{name:<10} {elapsed * 1000:9.2f} ms/response  {len(body) / 1024:8.1f} KiB")
+    return elapsed
+
+
+def main():
+    vip_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    docs = create_vip_documents(vip_count)
+
+    print(f"Serializing {vip_count} VIPs, {iterations} iterations")
+    baseline = time_path("baseline", baseline_path, docs, iterations)
+    fast = time_path("fast", fast_path, docs, iterations)
+    print(f"Speed-up: {baseline / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Startup profiling.
+
+main.py imports this module first and marks the end of each import group, and
+the startup hook times each of its phases. Set LBAAS_STARTUP_PROFILE=1 to print
+the report when startup finishes; it is always available to admins at
+/api/v1/admin/startup/profile. For a per-module import breakdown, run the app
+with `python -X importtime`.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+STARTUP_PROFILE_ENABLED = os.getenv("LBAAS_STARTUP_PROFILE", "") not in ("", "0", "false")
+
+
+class StartupProfile:
+    """Durations of the import groups and startup phases of this process"""
+
+    def __init__(self, enabled: bool = STARTUP_PROFILE_ENABLED):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.imports: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self.ready_after: float = 0.0
+
+    def mark_imports(self, name: str) -> None:
+        """Records the time since the previous mark as the import cost of a group of modules."""
+        now = time.perf_counter()
+        self.imports[name] = now - self._last_mark
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def ready(self) -> None:
+        """Call when the app can serve requests; prints the report in profile mode."""
+        self.ready_after = time.perf_counter() - self.started
+        if self.enabled:
+            print(f"Startup profile: {self.report()}")
+
+    def report(self) -> Dict[str, Any]:
+        def ms(seconds: float) -> float:
+            return round(seconds * 1000, 1)
+        return {
+            "imports_ms": {name: ms(seconds) for name, seconds in self.imports.items()},
+            "phases_ms": {name: ms(seconds) for name, seconds in self.phases.items()},
+            "ready_after_ms": ms(self.ready_after) if self.ready_after else None,
+        }
+
+
+startup_profile = StartupProfile()
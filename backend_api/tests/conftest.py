@@ -0,0 +1,19 @@
+"""
+Shared fixtures. MongoDB is replaced by mongomock-motor, an in-memory
+implementation of the Motor API, so the tests need no running mongod.
+
+Run from backend_api/:  pip install -r requirements-dev.txt && python -m pytest
+"""
+
+import os
+import sys
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_client():
+    return AsyncMongoMockClient()
@@ -0,0 +1,53 @@
+import mongomock
+import pytest
+
+import mongodb_config_storage
+from mongodb_config_storage import ConfigVersionConflictError, LBaaSConfigStorage
+
+CONFIG = {"virtual_server": {"ip_address": "10.0.0.10"}, "pools": []}
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setattr(mongodb_config_storage, "MongoClient", mongomock.MongoClient)
+    storage = LBaaSConfigStorage("mongodb://unused")
+    storage.configs.create_index("vip_id", unique=True)
+    return storage
+
+
+def store(storage, expected_version=None):
+    return storage.store_config("vip-1", CONFIG, "DEV", "LADC", "NGINX", "user1", expected_version=expected_version)
+
+
+def test_each_write_increments_the_version(storage):
+    store(storage)
+    store(storage, expected_version=1)
+
+    assert storage.configs.find_one({"vip_id": "vip-1"})["version"] == 2
+
+
+def test_stale_expected_version_raises_conflict_with_current_version(storage):
+    store(storage)
+    store(storage)
+
+    with pytest.raises(ConfigVersionConflictError) as raised:
+        store(storage, expected_version=1)
+
+    assert raised.value.current_version == 2
+    assert storage.configs.find_one({"vip_id": "vip-1"})["version"] == 2
+
+
+def test_create_only_conflicts_when_the_config_exists(storage):
+    store(storage, expected_version=0)
+
+    with pytest.raises(ConfigVersionConflictError) as raised:
+        store(storage, expected_version=0)
+
+    assert raised.value.current_version == 1
+
+
+def test_update_of_missing_config_conflicts(storage):
+    with pytest.raises(ConfigVersionConflictError) as raised:
+        store(storage, expected_version=1)
+
+    assert raised.value.current_version is None
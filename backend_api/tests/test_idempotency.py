@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+import idempotency
+from db import DATABASE_NAME, IDEMPOTENCY_COLLECTION_NAME
+from idempotency import run_idempotent
+
+
+def collection(db_client):
+    return db_client[DATABASE_NAME][IDEMPOTENCY_COLLECTION_NAME]
+
+
+def counting_operation(calls):
+    async def operation():
+        calls.append(1)
+        return Response(content=b'{"ok":true}', status_code=201, media_type="application/json")
+    return operation
+
+
+async def insert_claim(db_client, locked_until, payload=None):
+    await collection(db_client).insert_one({
+        "_id": "create_vip:user1:key-1",
+        "state": "in_progress",
+        "request_hash": idempotency._request_hash(payload or {"a": 1}),
+        "lease_owner": "crashed-process",
+        "locked_until": locked_until,
+        "created_at": datetime.now(timezone.utc),
+    })
+
+
+async def test_first_request_executes_and_retry_replays(db_client):
+    calls = []
+    first = await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, counting_operation(calls))
+    retry = await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, counting_operation(calls))
+    assert len(calls) == 1
+    assert first.status_code == retry.status_code == 201
+    assert retry.body == first.body
+    assert retry.headers[idempotency.REPLAY_HEADER] == "true"
+
+
+async def test_reused_key_with_different_payload_is_rejected(db_client):
+    await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, counting_operation([]))
+    with pytest.raises(HTTPException) as e:
+        await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 2}, counting_operation([]))
+    assert e.value.status_code == 422
+
+
+async def test_expired_claim_of_crashed_holder_is_taken_over(db_client):
+    await insert_claim(db_client, datetime.now(timezone.utc) - timedelta(seconds=1))
+    calls = []
+    response = await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, counting_operation(calls))
+    assert len(calls) == 1
+    assert response.status_code == 201
+    record = await collection(db_client).find_one({"_id": "create_vip:user1:key-1"})
+    assert record["state"] == "completed"
+    assert record["lease_owner"] != "crashed-process"
+
+
+async def test_claim_without_lease_is_taken_over(db_client):
+    await insert_claim(db_client, None)
+    await collection(db_client).update_one({"_id": "create_vip:user1:key-1"}, {"$unset": {"locked_until": ""}})
+    calls = []
+    await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, counting_operation(calls))
+    assert len(calls) == 1
+
+
+async def test_live_claim_is_not_taken_over(db_client, monkeypatch):
+    monkeypatch.setattr(idempotency, "IN_PROGRESS_WAIT_SECONDS", 0.3)
+    await insert_claim(db_client, datetime.now(timezone.utc) + timedelta(seconds=60))
+    calls = []
+    with pytest.raises(HTTPException) as e:
+        await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, counting_operation(calls))
+    assert e.value.status_code == 409
+    assert calls == []
+
+
+async def test_claim_expiring_while_waiting_is_taken_over(db_client, monkeypatch):
+    monkeypatch.setattr(idempotency, "IN_PROGRESS_WAIT_SECONDS", 2.0)
+    await insert_claim(db_client, datetime.now(timezone.utc) + timedelta(seconds=0.3))
+    calls = []
+    response = await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, counting_operation(calls))
+    assert len(calls) == 1
+    assert response.status_code == 201
+
+
+async def test_lease_is_renewed_while_executing(db_client, monkeypatch):
+    monkeypatch.setattr(idempotency, "CLAIM_RENEW_SECONDS", 0.05)
+    seen = []
+
+    async def slow_operation():
+        first = (await collection(db_client).find_one({}))["locked_until"]
+        await asyncio.sleep(0.2)
+        seen.extend([first, (await collection(db_client).find_one({}))["locked_until"]])
+        return Response(content=b"{}", status_code=201)
+
+    await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, slow_operation)
+    assert seen[1] > seen[0]
+
+
+async def test_failed_request_releases_the_key(db_client):
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await run_idempotent(db_client, "key-1", "create_vip:user1", {"a": 1}, failing)
+    assert await collection(db_client).find_one({}) is None
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from bson import ObjectId
+
+import provisioning
+from db import DATABASE_NAME, VIP_COLLECTION_NAME
+from etag import utc_now
+from provisioning import ProvisioningWorkerPool, get_jobs_collection, new_job_document
+
+
+async def queue_job(db_client, datacenter="LADC"):
+    vip_id = ObjectId()
+    await db_client[DATABASE_NAME][VIP_COLLECTION_NAME].insert_one(
+        {"_id": vip_id, "vip_fqdn": "a.example.com", "datacenter": datacenter, "port": 80}
+    )
+    job = new_job_document(vip_id, "user1")
+    await get_jobs_collection(db_client).insert_one(job)
+    return job
+
+
+async def test_claim_leases_a_job_to_one_worker(db_client):
+    job = await queue_job(db_client)
+    jobs = get_jobs_collection(db_client)
+
+    claimed = await ProvisioningWorkerPool().claim(jobs)
+
+    assert claimed["_id"] == job["_id"]
+    assert claimed["state"] == "running"
+    assert claimed["attempts"] == 1
+    assert claimed["lease_owner"]
+    assert await ProvisioningWorkerPool().claim(jobs) is None
+
+
+async def test_expired_lease_is_taken_over_and_fences_the_old_holder(db_client):
+    await queue_job(db_client)
+    jobs = get_jobs_collection(db_client)
+    first, second = ProvisioningWorkerPool(), ProvisioningWorkerPool()
+    stale = await first.claim(jobs)
+    await jobs.update_one({"_id": stale["_id"]}, {"$set": {"run_after": utc_now() - timedelta(seconds=1)}})
+
+    current = await second.claim(jobs)
+
+    assert current["lease_owner"] != stale["lease_owner"]
+    assert current["attempts"] == 2
+    assert not await first._update(jobs, stale, {"$set": {"state": "succeeded"}})
+    assert (await jobs.find_one({"_id": stale["_id"]}))["state"] == "running"
+
+
+async def test_failed_step_is_requeued_with_backoff(db_client, monkeypatch):
+    async def unavailable(db_client, job, vip):
+        raise provisioning.ProvisioningStepError("IPAM unavailable")
+
+    monkeypatch.setitem(provisioning.STEP_HANDLERS, "ipam_reservation", unavailable)
+    await queue_job(db_client)
+    jobs = get_jobs_collection(db_client)
+    pool = ProvisioningWorkerPool()
+    job = await pool.claim(jobs)
+
+    await pool.process(db_client, jobs, job)
+
+    stored = await jobs.find_one({"_id": job["_id"]})
+    assert stored["state"] == "queued"
+    assert stored["lease_owner"] is None
+    assert stored["steps"][0]["status"] == "failed"
+    assert pool.retried == 1
+
+
+async def test_unknown_datacenter_fails_without_retry(db_client):
+    await queue_job(db_client, datacenter="MARS")
+    jobs = get_jobs_collection(db_client)
+    pool = ProvisioningWorkerPool()
+    job = await pool.claim(jobs)
+
+    await pool.process(db_client, jobs, job)
+
+    stored = await jobs.find_one({"_id": job["_id"]})
+    assert stored["state"] == "failed"
+    assert "MARS" in stored["error"]
+    assert pool.failed == 1 and pool.retried == 0
@@ -0,0 +1,87 @@
+from bson import ObjectId
+
+import main
+from auth import User
+from db import DATABASE_NAME, VIP_COLLECTION_NAME
+from models import VipBatchRequest
+from provisioning import get_jobs_collection
+
+USER = User(username="user1", email="user1@example.com", role="user")
+
+
+def vip_payload(fqdn):
+    return {
+        "vip_fqdn": fqdn, "app_id": "111111", "environment": "Dev", "datacenter": "LADC",
+        "primary_contact_email": "user1@example.com", "monitor": {"type": "TCP", "port": 80},
+        "pool": [{"ip": "10.0.0.1", "port": 80}], "owner": "user1", "port": 80, "protocol": "TCP",
+    }
+
+
+def vips(db_client):
+    return db_client[DATABASE_NAME][VIP_COLLECTION_NAME]
+
+
+async def approved_incident(incident_id):
+    return {"valid": True}
+
+
+async def test_duplicate_delete_reports_second_item_not_found(db_client, monkeypatch):
+    monkeypatch.setattr(main, "validate_incident", approved_incident)
+    vip_id = ObjectId()
+    await vips(db_client).insert_one({"_id": vip_id, "owner": "user1", "version": 1})
+    batch = VipBatchRequest(operations=[
+        {"op": "delete", "vip_id": str(vip_id), "servicenow_incident_id": "INC1"},
+        {"op": "delete", "vip_id": str(vip_id), "servicenow_incident_id": "INC1"},
+    ], ordered=False)
+
+    response = await main.execute_vip_batch(batch, USER, db_client)
+
+    assert response.deleted_count == 1
+    assert [r.status_code for r in response.results] == [204, 404]
+    assert response.results[1].status == "failed"
+
+
+async def test_update_that_matched_nothing_is_not_reported_as_updated(db_client):
+    gone, foreign = ObjectId(), ObjectId()
+    await vips(db_client).insert_one({"_id": foreign, "owner": "someone-else"})
+    batch = VipBatchRequest(operations=[
+        {"op": "update", "vip_id": str(gone), "vip": {"port": 81}, "servicenow_incident_id": "INC1"},
+        {"op": "update", "vip_id": str(foreign), "vip": {"port": 81}, "servicenow_incident_id": "INC1"},
+    ])
+    results = [
+        main.VipBatchItemResult(index=i, op="update", status="updated", status_code=200, vip_id=op.vip_id)
+        for i, op in enumerate(batch.operations)
+    ]
+
+    await main.reconcile_batch_misses(vips(db_client), USER, batch, {0: gone, 1: foreign}, [0, 1], results, matched=0, removed=0)
+
+    assert [(r.status, r.status_code) for r in results] == [("failed", 404), ("failed", 403)]
+
+
+async def test_counts_that_add_up_leave_results_untouched(db_client):
+    vip_id = ObjectId()
+    batch = VipBatchRequest(operations=[{"op": "delete", "vip_id": str(vip_id), "servicenow_incident_id": "INC1"}])
+    results = [main.VipBatchItemResult(index=0, op="delete", status="deleted", status_code=204, vip_id=str(vip_id))]
+
+    await main.reconcile_batch_misses(vips(db_client), USER, batch, {0: vip_id}, [0], results, matched=0, removed=1)
+
+    assert results[0].status == "deleted"
+
+
+async def test_job_insert_failure_rolls_back_created_vips(db_client, monkeypatch):
+    class FailingJobs:
+        async def insert_many(self, documents, ordered=True):
+            raise RuntimeError("jobs collection unavailable")
+
+        async def delete_many(self, query):
+            return await get_jobs_collection(db_client).delete_many(query)
+
+    monkeypatch.setattr(main, "get_jobs_collection", lambda client: FailingJobs())
+    batch = VipBatchRequest(operations=[{"op": "create", "vip": vip_payload("a.example.com")}])
+
+    response = await main.execute_vip_batch(batch, USER, db_client)
+
+    assert response.results[0].status == "failed"
+    assert response.results[0].status_code == 500
+    assert response.inserted_count == 0
+    assert await vips(db_client).count_documents({}) == 0
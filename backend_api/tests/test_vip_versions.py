@@ -0,0 +1,102 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import main
+from auth import User
+from db import DATABASE_NAME, VIP_COLLECTION_NAME
+from etag import vip_etag
+from models import VipDeletePayload, VipUpdate
+
+USER = User(username="user1", email="user1@example.com", role="user")
+
+
+@pytest.fixture(autouse=True)
+def approved_incidents(monkeypatch):
+    async def approved(incident_id):
+        return {"valid": True}
+    monkeypatch.setattr(main, "validate_incident", approved)
+
+
+async def stored_vip(db_client, owner="user1", version=3):
+    vip_id = ObjectId()
+    await db_client[DATABASE_NAME][VIP_COLLECTION_NAME].insert_one({
+        "_id": vip_id, "vip_fqdn": "a.example.com", "app_id": "111111", "environment": "Dev", "datacenter": "LADC",
+        "primary_contact_email": "user1@example.com", "monitor": {"type": "TCP", "port": 80},
+        "pool": [{"ip": "10.0.0.1", "port": 80}], "owner": owner, "port": 80, "protocol": "TCP", "version": version,
+    })
+    return vip_id
+
+
+async def update(db_client, vip_id, expected_version=None, if_match=None):
+    return await main.update_vip(
+        str(vip_id), VipUpdate(port=81), current_user=USER, db_client=db_client,
+        servicenow_incident_id="INC1", expected_version=expected_version, if_match=if_match
+    )
+
+
+async def delete(db_client, vip_id, if_match=None):
+    return await main.delete_vip(
+        str(vip_id), VipDeletePayload(servicenow_incident_id="INC1"), main.Response(),
+        current_user=USER, db_client=db_client, if_match=if_match
+    )
+
+
+async def test_update_with_current_etag_bumps_version(db_client):
+    vip_id = await stored_vip(db_client)
+
+    response = await update(db_client, vip_id, if_match=vip_etag(vip_id, 3))
+
+    assert response.headers["ETag"] == vip_etag(vip_id, 4)
+
+
+async def test_update_with_stale_etag_is_412_with_current_etag(db_client):
+    vip_id = await stored_vip(db_client)
+
+    with pytest.raises(HTTPException) as raised:
+        await update(db_client, vip_id, if_match=vip_etag(vip_id, 2))
+
+    assert raised.value.status_code == 412
+    assert raised.value.headers["ETag"] == vip_etag(vip_id, 3)
+
+
+async def test_update_with_stale_expected_version_is_409(db_client):
+    vip_id = await stored_vip(db_client)
+
+    with pytest.raises(HTTPException) as raised:
+        await update(db_client, vip_id, expected_version=2)
+
+    assert raised.value.status_code == 409
+
+
+async def test_if_match_and_expected_version_must_agree(db_client):
+    vip_id = await stored_vip(db_client)
+
+    with pytest.raises(HTTPException) as raised:
+        await update(db_client, vip_id, expected_version=3, if_match=vip_etag(vip_id, 2))
+
+    assert raised.value.status_code == 409
+
+
+async def test_missed_write_explains_404_and_403(db_client):
+    foreign = await stored_vip(db_client, owner="someone-else")
+
+    with pytest.raises(HTTPException) as missing:
+        await update(db_client, ObjectId())
+    with pytest.raises(HTTPException) as forbidden:
+        await update(db_client, foreign)
+
+    assert missing.value.status_code == 404
+    assert forbidden.value.status_code == 403
+
+
+async def test_delete_with_stale_etag_keeps_the_vip(db_client):
+    vip_id = await stored_vip(db_client)
+
+    with pytest.raises(HTTPException) as raised:
+        await delete(db_client, vip_id, if_match=vip_etag(vip_id, 2))
+
+    assert raised.value.status_code == 412
+    assert await db_client[DATABASE_NAME][VIP_COLLECTION_NAME].count_documents({"_id": vip_id}) == 1
+    await delete(db_client, vip_id, if_match=vip_etag(vip_id, 3))
+    assert await db_client[DATABASE_NAME][VIP_COLLECTION_NAME].count_documents({"_id": vip_id}) == 0
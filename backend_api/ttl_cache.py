@@ -0,0 +1,109 @@
+"""
+Small bounded in-process cache with per-entry expiry.
+
+Used for short-lived memoization of expensive, read-only results (e.g. VIP
+inventory aggregations, incident validations). Entries are evicted in LRU order
+once max_entries is reached. get_or_load() coalesces concurrent misses for the
+same key into a single load.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.coalesced = 0
+        self._loading: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_for: Optional[Callable[[Any], Optional[float]]] = None
+    ) -> Any:
+        """
+        Returns the cached value, or awaits loader() once for all concurrent callers.
+
+        Args:
+            key: Cache key
+            loader: Coroutine factory producing the value on a miss
+            ttl_for: Maps a loaded value to its TTL in seconds; None means don't cache it
+                (defaults to ttl_seconds for every value)
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        task = self._loading.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # The load runs in its own task and every caller (the first one included) awaits it
+            # through shield(), so a cancelled caller never cancels the load for the others.
+            task = asyncio.get_running_loop().create_task(loader())
+            task.add_done_callback(lambda done: self._finish_load(key, done, ttl_for))
+            self._loading[key] = task
+            self.loads += 1
+        return await asyncio.shield(task)
+
+    def _finish_load(self, key: Hashable, task: "asyncio.Task[Any]", ttl_for: Optional[Callable[[Any], Optional[float]]]) -> None:
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        if task.cancelled() or task.exception() is not None: # exception() also marks it retrieved if every caller left
+            return
+        value = task.result()
+        ttl = self.ttl_seconds if ttl_for is None else ttl_for(value)
+        if ttl is not None and ttl > 0:
+            self.set(key, value, ttl)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "loading": len(self._loading),
+        }
@@ -0,0 +1,145 @@
+"""
+Read-through cache for validated VIP documents.
+
+Entries are VipDB objects keyed by _id, bounded by an approximate byte budget
+and a TTL. Coherence across API replicas comes from a MongoDB change stream on
+the vips collection: any insert/update/replace/delete evicts the affected _id on
+every replica. If the change stream cannot be opened (e.g. a standalone mongod
+without a replica set) the cache disables itself rather than serve stale data.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import bson
+import motor.motor_asyncio
+from pymongo.errors import PyMongoError
+
+from models import VipDB
+
+VIP_CACHE_MAX_BYTES = 32 * 1024 * 1024
+VIP_CACHE_TTL_SECONDS = 300.0
+CHANGE_STREAM_RETRY_SECONDS = 5.0
+
+
+class VipCache:
+    """LRU + TTL cache of VipDB objects with a size bound in bytes"""
+
+    def __init__(self, max_bytes: int = VIP_CACHE_MAX_BYTES, ttl_seconds: float = VIP_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = False # Turned on once the change stream is being watched
+        self._entries: "OrderedDict[Any, Tuple[VipDB, int, float]]" = OrderedDict()
+        self._size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation; a read that overlapped one must not be cached.
+        self._invalidation_seq = 0
+
+    def read_token(self) -> int:
+        """Call before reading from MongoDB; pass the result to put()."""
+        return self._invalidation_seq
+
+    def get(self, vip_id: Any) -> Optional[VipDB]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(vip_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        vip, size, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(vip_id)
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(vip_id)
+        self.hits += 1
+        return vip
+
+    def put(self, vip_doc: Dict[str, Any], read_token: Optional[int] = None) -> VipDB:
+        """Validates a raw VIP document, caches it and returns the VipDB."""
+        vip = VipDB(**vip_doc)
+        if not self.enabled or (read_token is not None and read_token != self._invalidation_seq):
+            return vip
+        size = len(bson.encode(vip_doc))
+        if size > self.max_bytes:
+            return vip
+        self._remove(vip_doc["_id"])
+        self._entries[vip_doc["_id"]] = (vip, size, time.monotonic() + self.ttl_seconds)
+        self._size_bytes += size
+        while self._size_bytes > self.max_bytes:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.evictions += 1
+        return vip
+
+    def invalidate(self, vip_id: Any) -> None:
+        self._invalidation_seq += 1
+        if self._remove(vip_id):
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._invalidation_seq += 1
+        self._entries.clear()
+        self._size_bytes = 0
+
+    def _remove(self, vip_id: Any) -> bool:
+        entry = self._entries.pop(vip_id, None)
+        if entry is None:
+            return False
+        self._size_bytes -= entry[1]
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    async def watch(self, collection: motor.motor_asyncio.AsyncIOMotorCollection) -> None:
+        """Consumes the collection's change stream and evicts changed VIPs. Runs until cancelled."""
+        resume_token = None
+        while True:
+            try:
+                async with collection.watch(resume_after=resume_token) as change_stream:
+                    if resume_token is None:
+                        # Fresh stream: anything cached before it opened may have missed events.
+                        self.clear()
+                    self.enabled = True
+                    print("VIP cache: watching change stream on vips collection.")
+                    async for change in change_stream:
+                        resume_token = change_stream.resume_token
+                        if change.get("operationType") in ("drop", "rename", "dropDatabase", "invalidate"):
+                            self.clear()
+                            resume_token = None
+                            break
+                        document_key = change.get("documentKey")
+                        if document_key:
+                            self.invalidate(document_key["_id"])
+            except asyncio.CancelledError:
+                self.enabled = False
+                raise
+            except PyMongoError as e:
+                print(f"VIP cache disabled, change stream unavailable: {e}")
+                self.enabled = False
+                self.clear()
+                resume_token = None
+            self.enabled = False
+            await asyncio.sleep(CHANGE_STREAM_RETRY_SECONDS)
+
+
+vip_cache = VipCache()
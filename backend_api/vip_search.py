@@ -0,0 +1,145 @@
+"""
+Indexed FQDN search for VIPs.
+
+Every VIP document carries derived fields maintained on the write path:
+
+    vip_fqdn_lower   "app1.prod.ladc.davelab.net"   prefix matches   (app1*)
+    fqdn_reversed    "net.davelab.ladc.prod.app1"   suffix matches   (*.prod.ladc.davelab.net)
+    fqdn_trigrams    ["app", "pp1", "p1.", ...]     substring matches (ladc)
+
+Prefix and suffix searches become anchored regexes on an indexed field, which
+MongoDB executes as an index range scan. Substring searches use the multikey
+trigram index to find candidates ($all of the query's trigrams) and a regex to
+confirm them.
+
+Matches are ranked across the whole match set, not per page: the search
+pipeline computes a search_rank for every match, sorts on (search_rank, _id)
+and pages with a keyset cursor over that pair.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+
+MIN_SUBSTRING_LENGTH = 3
+BACKFILL_BATCH_SIZE = 1000
+SEARCH_FIELDS = ("vip_fqdn_lower", "fqdn_reversed", "fqdn_trigrams")
+
+
+def reverse_labels(fqdn: str) -> str:
+    return ".".join(reversed(fqdn.strip(".").split(".")))
+
+
+def trigrams(value: str) -> List[str]:
+    return sorted({value[i:i + 3] for i in range(len(value) - 2)})
+
+
+def query_trigrams(term: str) -> List[str]:
+    """
+    Trigrams to require for a substring search. Grams spanning a dot (".la", "c.d") occur in
+    nearly every FQDN and select almost nothing, so they're left to the confirming regex
+    unless the term has no other grams.
+    """
+    grams = trigrams(term)
+    return [gram for gram in grams if "." not in gram] or grams
+
+
+def search_fields(vip_fqdn: str) -> Dict[str, Any]:
+    """Derived search fields to store alongside vip_fqdn."""
+    fqdn = vip_fqdn.lower()
+    return {
+        "vip_fqdn_lower": fqdn,
+        "fqdn_reversed": reverse_labels(fqdn),
+        "fqdn_trigrams": trigrams(fqdn),
+    }
+
+
+def build_search_filter(q: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Translate a ?q= value into an indexed MongoDB filter.
+
+    Returns:
+        (filter, mode) where mode is "suffix", "prefix" or "substring"
+    """
+    term = q.strip().lower()
+    if term.startswith("*.") or term.startswith("."):
+        # *.prod.ladc.davelab.net -> every FQDN under that domain
+        domain = term.lstrip("*").strip(".")
+        return {"fqdn_reversed": {"$regex": "^" + re.escape(reverse_labels(domain) + ".")}}, "suffix"
+    if term.endswith("*"):
+        return {"vip_fqdn_lower": {"$regex": "^" + re.escape(term.rstrip("*"))}}, "prefix"
+    if len(term) < MIN_SUBSTRING_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Substring searches need at least {MIN_SUBSTRING_LENGTH} characters; use 'prefix*' or '*.domain' for shorter terms."
+        )
+    return {
+        "fqdn_trigrams": {"$all": query_trigrams(term)},
+        "vip_fqdn_lower": {"$regex": re.escape(term)},
+    }, "substring"
+
+
+def search_rank_stage(q: str) -> Dict[str, Any]:
+    """
+    $addFields stage computing search_rank (lower is better): exact match, then prefix match,
+    then how early the term appears, then shortest FQDN. FQDNs are at most 253 characters,
+    so the components pack into one integer without overlapping.
+    """
+    term = q.strip().lower().strip("*").strip(".")
+    fqdn = {"$ifNull": ["$vip_fqdn_lower", ""]}
+    position = {"$indexOfCP": [fqdn, term]}
+    length = {"$strLenCP": fqdn}
+    return {"$addFields": {"search_rank": {"$add": [
+        {"$cond": [{"$eq": [fqdn, term]}, 0, 1_000_000]},
+        {"$cond": [{"$eq": [position, 0]}, 0, 100_000]},
+        {"$multiply": [{"$cond": [{"$lt": [position, 0]}, length, position]}, 1000]},
+        length,
+    ]}}}
+
+
+def rank_cursor(vip_doc: Dict[str, Any]) -> str:
+    """Keyset cursor for the search ordering: '<search_rank>.<_id>'."""
+    return f"{vip_doc['search_rank']}.{vip_doc['_id']}"
+
+
+def rank_cursor_filter(after: str) -> Dict[str, Any]:
+    """$match condition for the matches that sort after a rank_cursor value."""
+    rank, _, vip_id = after.partition(".")
+    if not rank.isdigit() or not ObjectId.is_valid(vip_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {after}")
+    rank, vip_id = int(rank), ObjectId(vip_id)
+    return {"$or": [{"search_rank": {"$gt": rank}}, {"search_rank": rank, "_id": {"$gt": vip_id}}]}
+
+
+def search_pipeline(query: Dict[str, Any], q: str, projection: Optional[Dict[str, int]] = None,
+                    after: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Ranked search over the whole match set, sorted on (search_rank, _id)."""
+    pipeline: List[Dict[str, Any]] = [{"$match": query}, search_rank_stage(q)]
+    if after:
+        pipeline.append({"$match": rank_cursor_filter(after)})
+    pipeline.append({"$sort": {"search_rank": 1, "_id": 1}})
+    if limit is not None:
+        pipeline.append({"$limit": limit}) # With the $sort this is a top-k sort, not a full one
+    if projection is not None:
+        pipeline.append({"$project": {**projection, "search_rank": 1}})
+    return pipeline
+
+
+async def backfill_search_fields(vips_collection) -> int:
+    """Adds search fields to VIPs written before they existed (e.g. by seed_mongo.py)."""
+    requests = []
+    updated = 0
+    async for vip in vips_collection.find({"fqdn_reversed": {"$exists": False}}, {"vip_fqdn": 1}):
+        if vip.get("vip_fqdn"):
+            requests.append(UpdateOne({"_id": vip["_id"]}, {"$set": search_fields(vip["vip_fqdn"])}))
+        if len(requests) >= BACKFILL_BATCH_SIZE:
+            await vips_collection.bulk_write(requests, ordered=False)
+            updated += len(requests)
+            requests = []
+    if requests:
+        await vips_collection.bulk_write(requests, ordered=False)
+        updated += len(requests)
+    return updated
@@ -63,6 +63,18 @@ class FQDNUpdateRequest(BaseModel):
     ip_address: str = Field(..., example="10.10.10.100")
     new_fqdn: str = Field(..., example="new-vip.davelab.net")
 
+MAX_BULK_ITEMS = 1000
+
+class BulkIPAllocation(BaseModel):
+    subnet_id: str = Field(..., example="LADC-subnet")
+    fqdn: str = Field(..., example="vip123.davelab.net", description="FQDN to register for the allocated IP.")
+
+class BulkIPRequest(BaseModel):
+    allocations: List[BulkIPAllocation] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkIPReservation(BaseModel):
+    reservations: List[IPReservation] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
 # --- API Endpoints ---
 @app.get("/health", tags=["Health"], summary="Health check for Mock IPAM service")
 async def health_check():
@@ -91,8 +103,8 @@ async def request_ip(ip_request: IPRequest):
     
     return IPReservation(ip_address=potential_ip, fqdn=mock_fqdn, subnet_id=subnet_name)
 
-@app.post("/api/ipam/reserve_ip", tags=["IPAM"], summary="Reserve a specific IP with an FQDN")
-async def reserve_ip(reservation: IPReservation):
+def check_reservation(reservation: IPReservation):
+    """Raises HTTPException if the reservation can't be applied; changes nothing."""
     subnet_name = reservation.subnet_id
     ip_to_reserve = reservation.ip_address
     fqdn_to_reserve = reservation.fqdn
@@ -117,6 +129,11 @@ async def reserve_ip(reservation: IPReservation):
     elif fqdn_to_reserve in mock_dns_records and mock_dns_records[fqdn_to_reserve] != ip_to_reserve:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"FQDN '{fqdn_to_reserve}' already in use by IP '{mock_dns_records[fqdn_to_reserve]}'.")
 
+def apply_reservation(reservation: IPReservation):
+    subnet_name = reservation.subnet_id
+    ip_to_reserve = reservation.ip_address
+    fqdn_to_reserve = reservation.fqdn
+
     # If IP was available, move it from available to used
     if ip_to_reserve in ip_pools[subnet_name]["available"]:
         ip_pools[subnet_name]["available"].remove(ip_to_reserve)
@@ -124,7 +141,66 @@ async def reserve_ip(reservation: IPReservation):
     
     mock_ip_allocations[ip_to_reserve] = {"fqdn": fqdn_to_reserve, "subnet": subnet_name}
     mock_dns_records[fqdn_to_reserve] = ip_to_reserve
-    return {"status": "success", "message": f"IP '{ip_to_reserve}' reserved for FQDN '{fqdn_to_reserve}' in subnet '{subnet_name}'."}
+
+@app.post("/api/ipam/reserve_ip", tags=["IPAM"], summary="Reserve a specific IP with an FQDN")
+async def reserve_ip(reservation: IPReservation):
+    check_reservation(reservation)
+    apply_reservation(reservation)
+    return {"status": "success", "message": f"IP '{reservation.ip_address}' reserved for FQDN '{reservation.fqdn}' in subnet '{reservation.subnet_id}'."}
+
+# --- Bulk endpoints ---
+# Every item is validated before anything is changed, and there is no await between
+# validation and the updates, so a bulk call is all-or-nothing.
+
+def bulk_error(index: int, e: HTTPException) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail={"index": index, "detail": e.detail, "message": "No IPs were allocated."})
+
+@app.post("/api/ipam/request_ips", response_model=List[IPReservation], tags=["IPAM"], summary="Allocate the next available IPs for many FQDNs at once (all-or-nothing)")
+async def request_ips(bulk_request: BulkIPRequest):
+    needed: Dict[str, int] = {}
+    seen_fqdns: Set[str] = set()
+    for index, allocation in enumerate(bulk_request.allocations):
+        if allocation.subnet_id not in KNOWN_SUBNETS:
+            raise bulk_error(index, HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Subnet ID '{allocation.subnet_id}' not found or not managed."))
+        if allocation.fqdn in mock_dns_records:
+            raise bulk_error(index, HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"FQDN '{allocation.fqdn}' already in use by IP '{mock_dns_records[allocation.fqdn]}'."))
+        if allocation.fqdn in seen_fqdns:
+            raise bulk_error(index, HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"FQDN '{allocation.fqdn}' appears more than once in the request."))
+        seen_fqdns.add(allocation.fqdn)
+        needed[allocation.subnet_id] = needed.get(allocation.subnet_id, 0) + 1
+    for subnet_name, count in needed.items():
+        available = len(ip_pools[subnet_name]["available"])
+        if count > available:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Subnet '{subnet_name}' has {available} available IPs; {count} requested. No IPs were allocated.")
+
+    reservations = []
+    for allocation in bulk_request.allocations:
+        ip_address = ip_pools[allocation.subnet_id]["available"].pop()
+        ip_pools[allocation.subnet_id]["used"].add(ip_address)
+        mock_ip_allocations[ip_address] = {"fqdn": allocation.fqdn, "subnet": allocation.subnet_id}
+        mock_dns_records[allocation.fqdn] = ip_address
+        reservations.append(IPReservation(ip_address=ip_address, fqdn=allocation.fqdn, subnet_id=allocation.subnet_id))
+    return reservations
+
+@app.post("/api/ipam/reserve_ips", tags=["IPAM"], summary="Reserve many specific IPs with their FQDNs at once (all-or-nothing)")
+async def reserve_ips(bulk_reservation: BulkIPReservation):
+    batch_ips: Dict[str, str] = {} # ip -> fqdn within this request
+    batch_fqdns: Dict[str, str] = {} # fqdn -> ip within this request
+    for index, reservation in enumerate(bulk_reservation.reservations):
+        try:
+            check_reservation(reservation)
+        except HTTPException as e:
+            raise bulk_error(index, e)
+        if batch_ips.get(reservation.ip_address, reservation.fqdn) != reservation.fqdn:
+            raise bulk_error(index, HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"IP '{reservation.ip_address}' appears more than once with different FQDNs."))
+        if batch_fqdns.get(reservation.fqdn, reservation.ip_address) != reservation.ip_address:
+            raise bulk_error(index, HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"FQDN '{reservation.fqdn}' appears more than once with different IPs."))
+        batch_ips[reservation.ip_address] = reservation.fqdn
+        batch_fqdns[reservation.fqdn] = reservation.ip_address
+
+    for reservation in bulk_reservation.reservations:
+        apply_reservation(reservation)
+    return {"status": "success", "reserved": len(bulk_reservation.reservations), "message": f"{len(bulk_reservation.reservations)} IPs reserved."}
 
 @app.post("/api/ipam/release_ip", tags=["IPAM"], summary="Release an IP address")
 async def release_ip(release_info: IPRelease):